@@ -0,0 +1,165 @@
+'''Advice for a player at the terminal: both draw choices and every discard scored by the odds of
+completing the phase within a few more draws, and by the points that would be left in hand.
+Candidates are sampled in parallel over a process pool, and their odds are kept in an LRU cache keyed
+by the hand's shape (see shape()) and the phase, so a hand seen before is answered at once.
+Draws are sampled from the deck less the hand, the discard and tabled cards are not taken into
+account, which is what makes the answers depend on the hand alone'''
+import os
+from collections import OrderedDict
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+from typing import NamedTuple
+from card import POOL, NUM_IDS, VALS, COLOR_VALS
+from stack import Hand, DECK_COUNTS, phase_spec
+from engine import Engine, Player
+from solver import can_complete
+
+DRAWS = 3 # draws looked ahead
+SAMPLES = 200 # at most, per candidate
+MIN_SAMPLES = 20 # at least, whatever the budget
+BUDGET = 0.15 # seconds for a call with nothing cached, split between the candidates
+CACHE_SIZE = 4096
+
+class Advice(NamedTuple):
+    choice: str # "discard" or "deck" when drawing, otherwise the repr of the card to discard
+    odds: float # of completing the phase within DRAWS more draws
+    points: int # left in hand
+
+    def __str__(self):
+        return f"{self.choice} {self.odds:.0%} {self.points}pts"
+
+def shape(ids, phase_strs: tuple[str, ...]) -> tuple:
+    '''Returns the hand's histogram with what phase_strs can't tell apart merged: cards are counted by
+    face unless a part is a color set, by color if every part is one, by id otherwise
+
+    >>> from card import Card, Faces, Colors
+    >>> red, blue = Card(Faces.ONE, Colors.RED).id, Card(Faces.ONE, Colors.BLUE).id
+    >>> shape([red], ("set3",)) == shape([blue], ("set3",)), shape([red], ("set7c",)) == shape([blue], ("set7c",))
+    (True, False)
+    '''
+    kinds = {phase_spec(phase_str).kind for phase_str in phase_strs}
+    if "color" not in kinds:
+        keys = VALS # skips and wilds have faces of their own
+    elif kinds == {"color"}:
+        keys = COLOR_VALS # and colors of their own
+    else:
+        keys = range(NUM_IDS)
+    size = max(keys) + 1
+    counts = [0] * size
+    for num in ids:
+        counts[keys[num]] += 1
+    return phase_strs, bytes(counts)
+
+def evaluate(job: tuple) -> float:
+    '''Worker: the share of samples in which hand_ids plus draws cards from the rest of the deck complete phase_strs.
+    Sampling stops early once seconds are up'''
+    hand_ids, phase_strs, draws, samples, seconds, seed = job
+    deadline = perf_counter() + seconds
+    rng = Random(seed)
+    counts = list(DECK_COUNTS)
+    hand = Hand()
+    for num in hand_ids:
+        counts[num] -= 1
+        hand.push(POOL[num])
+    unseen = [num for num, count in enumerate(counts) for _ in range(count)]
+    hits = done = 0
+    while done < samples and (done < MIN_SAMPLES or perf_counter() < deadline):
+        for num in rng.sample(unseen, draws):
+            hand.push(POOL[num])
+        hits += can_complete(hand, phase_strs)
+        for _ in range(draws):
+            hand.pop()
+        done += 1
+    return hits / done
+
+class Advisor:
+    '''Scores draw and discard choices for a player (see module doc). workers = 0 (or a single core)
+    samples in this process, None uses every core
+
+    >>> from engine import Controller
+    >>> engine = Engine([Controller()], seed = 4)
+    >>> engine.deal()
+    >>> advisor = Advisor(samples = 50, budget = 1.0, workers = 0)
+    >>> [advice.choice for advice in advisor.draws(engine, engine.players[0])] in (["discard", "deck"], ["deck", "discard"])
+    True
+    >>> engine.draw(False)
+    False
+    >>> advice = advisor.discards(engine, engine.players[0])
+    >>> 0 < len(advice) <= 11, advice == sorted(advice, key = lambda advice: (-advice.odds, advice.points))
+    (True, True)
+    >>> misses = advisor.misses
+    >>> advice == advisor.discards(engine, engine.players[0]), advisor.misses == misses # answered from the cache
+    (True, True)
+    '''
+
+    def __init__(self, draws: int = DRAWS, samples: int = SAMPLES, budget: float = BUDGET, workers: int = None,
+                 cache_size: int = CACHE_SIZE):
+        self.draws_ahead = draws
+        self.samples = samples
+        self.budget = budget
+        self.workers = os.cpu_count() if workers is None else workers
+        self.cache_size = cache_size
+        self.cache: OrderedDict[tuple, float] = OrderedDict()
+        self.hits = self.misses = 0
+        self.pool = None
+
+    def odds(self, hands: list[tuple[list[int], int]], phase_strs: tuple[str, ...]) -> list[float]:
+        '''The odds of every (hand ids, draws) completing phase_strs within draws, sampling only the hands not cached'''
+        keys = [(shape(ids, phase_strs), draws) for ids, draws in hands]
+        missing = {}
+        for key, (ids, draws) in zip(keys, hands):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            elif key not in missing:
+                missing[key] = (tuple(ids), phase_strs, draws)
+        if missing:
+            self.misses += len(missing)
+            parallel = self.workers > 1 and len(missing) > 1
+            seconds = self.budget * (min(self.workers, len(missing)) if parallel else 1) / len(missing)
+            jobs = [job + (self.samples, seconds, repr(key)) for key, job in missing.items()]
+            if parallel:
+                if self.pool is None:
+                    self.pool = Pool(self.workers)
+                results = self.pool.map(evaluate, jobs)
+            else:
+                results = map(evaluate, jobs)
+            for key, odds in zip(missing, results):
+                self.cache[key] = odds
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last = False)
+        return [self.cache[key] for key in keys]
+
+    def draws(self, engine: Engine, player: Player) -> list[Advice]:
+        '''Both draw choices, best first. A deck draw counts as one more random draw'''
+        hand = list(player.cards.ids)
+        choices = [("deck", hand, self.draws_ahead + 1, player.cards.sum())]
+        if not engine.pickup.discard.is_empty():
+            top = engine.pickup.discard.top()
+            choices.append(("discard", hand + [top.id], self.draws_ahead, player.cards.sum() + top.val))
+        return self._rank(engine, player, choices)
+
+    def discards(self, engine: Engine, player: Player) -> list[Advice]:
+        '''Every distinct card in hand as the discard, best first'''
+        hand = list(player.cards.ids)
+        choices = []
+        for num in dict.fromkeys(hand):
+            rest = list(hand)
+            rest.remove(num)
+            choices.append((POOL[num]._repr, rest, self.draws_ahead, player.cards.sum() - VALS[num]))
+        return self._rank(engine, player, choices)
+
+    def _rank(self, engine: Engine, player: Player, choices: list[tuple]) -> list[Advice]:
+        if player.out: # nothing left to complete, only the points matter
+            odds = [1.0] * len(choices)
+        else:
+            odds = self.odds([(ids, draws) for _, ids, draws, _ in choices], tuple(engine.phases[player.phase]))
+        advice = [Advice(choice, odd, points) for (choice, _, _, points), odd in zip(choices, odds)]
+        return sorted(advice, key = lambda advice: (-advice.odds, advice.points))
+
+    def close(self):
+        '''Shuts down the sampling workers'''
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
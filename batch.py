@@ -0,0 +1,120 @@
+'''Vectorized phase evaluation over many hands at once. Needs NumPy (the rest of the game does not)'''
+from itertools import product
+import numpy as np
+from card import NUM_IDS, VALS, COLOR_VALS
+from solver import parse
+
+PAD = 255 # fills the unused columns of a card id matrix
+
+IS_WILD = np.array([val == 25 for val in VALS])
+IS_SKIP = np.array([val == 15 for val in VALS])
+# non-wild cards by face (val + 1, as Phase.face_counts) and by color
+FACE_OF = np.array([[not IS_WILD[num] and VALS[num] + 1 == face for face in range(27)] for num in range(NUM_IDS)], dtype = np.int32)
+COLOR_OF = np.array([[not IS_WILD[num] and COLOR_VALS[num] == color for color in range(6)] for num in range(NUM_IDS)], dtype = np.int32)
+NUMBER_FACE_OF = FACE_OF[:, 2:14] # faces 1-12 only
+NUMBER_COLOR_OF = COLOR_OF * np.array([[1 <= val <= 12] for val in VALS], dtype = np.int32)
+
+def histograms(ids: np.ndarray) -> np.ndarray:
+    '''Turns an (N, cards) matrix of card ids (padded with PAD) into (N, NUM_IDS) card id counts
+
+    >>> histograms(np.array([[0, 5, 5], [95, PAD, PAD]]))[:, [0, 5, 95]].tolist()
+    [[1, 2, 0], [0, 0, 1]]
+    '''
+    ids = np.asarray(ids, dtype = np.int64)
+    rows = np.broadcast_to(np.arange(len(ids))[:, None], ids.shape)
+    held = ids != PAD
+    hists = np.zeros((len(ids), NUM_IDS), dtype = np.int32)
+    np.add.at(hists, (rows[held], ids[held]), 1)
+    return hists
+
+def is_phase(hists: np.ndarray, phase_str: str) -> np.ndarray:
+    '''Returns, for every row, what Phase(phase_str).is_phase() says when all of the row's cards
+    are pushed into it
+
+    >>> from card import Card, Faces, Colors
+    >>> rows = [[Card(Faces.ONE, Colors.RED).id, Card(Faces.WILD, Colors.ANY).id, Card(Faces.TWO, Colors.RED).id],
+    ...         [Card(Faces.ONE, Colors.RED).id, Card(Faces.FOUR, Colors.RED).id, Card(Faces.WILD, Colors.ANY).id]]
+    >>> is_phase(histograms(rows), "set3c").tolist(), is_phase(histograms(rows), "run3").tolist()
+    ([True, True], [True, False])
+    '''
+    kind, size = parse(phase_str)
+    hists = np.asarray(hists)
+    enough = hists.sum(axis = 1) >= size
+    no_skips = hists[:, IS_SKIP].sum(axis = 1) == 0
+    faces = hists @ FACE_OF
+    if kind == "set":
+        return enough & no_skips & ((faces > 0).sum(axis = 1) == 1)
+    if kind == "color":
+        return enough & no_skips & (((hists @ COLOR_OF) > 0).sum(axis = 1) == 1)
+    held = faces > 0
+    distinct = held.sum(axis = 1)
+    low = held.argmax(axis = 1)
+    high = faces.shape[1] - 1 - held[:, ::-1].argmax(axis = 1)
+    gaps = np.where(distinct > 0, high - low + 1 - distinct, 0)
+    wilds = hists[:, IS_WILD].sum(axis = 1)
+    return enough & no_skips & ((faces > 1).sum(axis = 1) == 0) & (gaps <= wilds)
+
+def _demands(parts: list[tuple[str, int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''Every way to place the parts: cards wanted per face 1-12, sets needing a natural per face,
+    and run positions that fall outside 1-12 (wilds only)'''
+    choices = []
+    for kind, size in parts:
+        if kind == "run":
+            choices.append([("run", start, size) for start in range(min(1, 13 - size), max(1, 13 - size) + 1)])
+        else:
+            choices.append([(kind, key, size) for key in range(1, 13 if kind == "set" else 5)])
+    placements = {} # parts of the same kind and size give the same placement in any order
+    for combo in product(*choices):
+        want, need, out = [0] * 12, [0] * 12, 0
+        for kind, key, size in combo:
+            if kind == "run":
+                for face in range(key, key + size):
+                    if 1 <= face <= 12:
+                        want[face - 1] += 1
+                    else:
+                        out += 1
+            else:
+                want[key - 1] += size
+                need[key - 1] += 1
+        placements[(tuple(want), tuple(need), out)] = None
+    wanted, naturals, outside = zip(*placements)
+    return np.array(wanted, dtype = np.int16), np.array(naturals, dtype = np.int16), np.array(outside, dtype = np.int16)
+
+def best_fit(hists: np.ndarray, phase_strs: list[str], chunk: int = 4096) -> np.ndarray:
+    '''Returns, for every row, the fewest cards the hand is missing to complete phase_strs
+    (0 means the hand can complete the phase, agreeing with solver.can_complete).
+    Color sets can't be mixed with face sets or runs
+
+    >>> from card import Card, Faces, Colors
+    >>> rows = [[Card(Faces.TWO, Colors.RED).id, Card(Faces.TWO, Colors.BLUE).id, Card(Faces.WILD, Colors.ANY).id,
+    ...          Card(Faces.FOUR, Colors.RED).id, Card(Faces.FIVE, Colors.GREEN).id]]
+    >>> best_fit(histograms(rows), ["set3", "run4"]).tolist(), best_fit(histograms(rows), ["set2", "run3"]).tolist()
+    ([2], [0])
+    '''
+    parts = [parse(phase_str) for phase_str in phase_strs]
+    colors = [kind == "color" for kind, _ in parts]
+    if any(colors) and not all(colors):
+        raise ValueError("color sets can not be batched together with face sets or runs")
+    hists = np.asarray(hists)
+    wilds = hists[:, IS_WILD].sum(axis = 1).astype(np.int16)
+    avail = (hists @ (NUMBER_COLOR_OF[:, 1:5] if all(colors) else NUMBER_FACE_OF)).astype(np.int16)
+    wanted, naturals, outside = _demands(parts)
+    if all(colors):
+        wanted, naturals = wanted[:, :4], naturals[:, :4]
+    missing = np.empty(len(hists), dtype = np.int16)
+    for start in range(0, len(hists), chunk):
+        have = avail[start:start + chunk, None, :] # (rows, 1, keys) against (combos, keys)
+        used = np.minimum(have, wanted)
+        short = np.maximum(naturals - have, 0) # sets without a natural can't be made of wilds
+        by_wild = (wanted - used - short).sum(axis = 2) + outside
+        total = short.sum(axis = 2) + np.maximum(by_wild - wilds[start:start + chunk, None], 0)
+        missing[start:start + chunk] = total.min(axis = 1)
+    return missing
+
+def can_complete(hists: np.ndarray, phase_strs: list[str]) -> np.ndarray:
+    '''Returns, for every row, True if the hand holds the cards to complete phase_strs'''
+    return best_fit(hists, phase_strs) == 0
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -0,0 +1,235 @@
+'''Timings of the game's hot paths, written as JSON so runs can be compared over time.
+A run checked against a baseline fails when any benchmark got slower than the threshold allows
+
+    python bench.py --out baseline.json
+    python bench.py --baseline baseline.json --threshold 0.25
+    python bench.py --sweep --filter round/
+    python bench.py --soak 1000000'''
+import gc
+import json
+import platform
+import sys
+from time import perf_counter
+from random import Random
+from timeit import Timer
+from card import Card, POOL, DECK, DECK_IDS
+from stack import Stack, Pickup, Phase
+from engine import Engine, Controller, Step
+from bots import GreedyController
+
+BENCHES = {} # name -> setup returning the function to time
+SWEEP = {} # same, for the scaling sweep
+ROUND_SEEDS = 4 # rounds played per call of the round benchmarks
+
+def bench(name: str, registry: dict = BENCHES):
+    '''Registers a setup function under name'''
+    def register(setup):
+        registry[name] = setup
+        return setup
+    return register
+
+def dealt_engine(num_players: int) -> Engine:
+    engine = Engine([Controller() for _ in range(num_players)], seed = 0)
+    engine.deal()
+    return engine
+
+def redeal(engine: Engine):
+    for player in engine.players:
+        player.cards.clear()
+    engine.step = Step.DEAL
+    engine.deal()
+
+def rounds(num_players: int, phases: list[list[str]] = None):
+    '''Plays the same few seeded headless rounds between greedy players every call'''
+    def play():
+        for seed in range(ROUND_SEEDS):
+            engine = Engine([GreedyController() for _ in range(num_players)], phases or [["set3", "run4"]], seed)
+            engine.play_round(max_turns = 500)
+    return play
+
+def grown(phase_str: str, ids: list[int]) -> Phase:
+    '''A tabled phase holding ids'''
+    phase = Phase(phase_str)
+    for num in ids:
+        phase.push(POOL[num])
+    phase.merge()
+    return phase
+
+SET_IDS = [card.id for card in DECK if card.val == 7] + [card.id for card in DECK if card.val == 25] # 8 sevens, 8 wilds
+RUN_IDS = [POOL[DECK_IDS[index * 8]].id for index in range(12)] # one card of every face 1-12
+
+@bench("pickup.shuffle")
+def _shuffle():
+    pickup, rng = Pickup(), Random(0)
+    return lambda: pickup.shuffle(rng)
+
+@bench("engine.deal")
+def _deal():
+    engine = dealt_engine(4)
+    return lambda: redeal(engine)
+
+@bench("discard.recycle")
+def _recycle():
+    pickup, rng = Pickup(), Random(0)
+    ids = DECK_IDS[:90]
+    def recycle():
+        pickup.discard.load(ids)
+        pickup.discard.recycle(pickup, rng)
+    return recycle
+
+@bench("hand.find+pop")
+def _find_pop():
+    hand = dealt_engine(1).players[0].cards
+    card_repr = POOL[hand.ids[5]]._repr
+    def find_pop():
+        hand.push(hand.pop(hand.find(card_repr)))
+    return find_pop
+
+@bench("hand.face_sort")
+def _face_sort():
+    hand = dealt_engine(1).players[0].cards
+    return hand.face_sort
+
+@bench("hand.color_sort")
+def _color_sort():
+    hand = dealt_engine(1).players[0].cards
+    return hand.color_sort
+
+for size in (3, 6, 12, 16):
+    @bench(f"phase.is_set/{size}")
+    def _is_set(size = size):
+        phase = grown("set3", SET_IDS[:size])
+        return lambda: phase.is_set(size, "face")
+
+for size in (3, 6, 9, 12):
+    @bench(f"phase.is_run/{size}")
+    def _is_run(size = size):
+        phase = grown("run3", RUN_IDS[:size])
+        return lambda: phase.is_run(size)
+
+    @bench(f"phase.merge/{size}")
+    def _merge(size = size):
+        phase = grown("run3", RUN_IDS[:size - 1])
+        card = POOL[RUN_IDS[size - 1]]
+        def merge():
+            phase.push(card)
+            phase.merge()
+            Stack.pop(phase, phase.ids.index(card.id)) # back to size - 1 for the next call
+            phase._count(card, -1)
+        return merge
+
+@bench("card.__str__")
+def _card_str():
+    card = DECK[0]
+    return lambda: str(card)
+
+@bench("card.str_cards")
+def _str_cards():
+    cards = list(DECK[:11])
+    return lambda: Card.str_cards(cards)
+
+@bench("card.str_cards/uncached")
+def _str_cards_uncached():
+    cards = list(DECK[:11])
+    def str_cards():
+        Card.str_ids.cache_clear()
+        Card.lines_ids.cache_clear()
+        Card.str_cards(cards)
+    return str_cards
+
+@bench("phase.str_phases")
+def _str_phases():
+    phases = [grown("set3", SET_IDS[:3]), grown("run4", RUN_IDS[:4])]
+    return lambda: Phase.str_phases(phases)
+
+@bench("engine.round/2")
+def _round():
+    return rounds(2)
+
+for num_players in range(1, 9):
+    @bench(f"engine.deal/players={num_players}", SWEEP)
+    def _deal_players(num_players = num_players):
+        engine = dealt_engine(num_players)
+        return lambda: redeal(engine)
+
+for num_players in range(1, 7):
+    @bench(f"engine.round/players={num_players}", SWEEP)
+    def _round_players(num_players = num_players):
+        return rounds(num_players)
+
+for size in range(3, 10):
+    for kind in ("set", "run"):
+        @bench(f"engine.round/{kind}{size}", SWEEP)
+        def _round_size(phase_str = f"{kind}{size}"):
+            return rounds(2, [[phase_str]])
+
+def measure(func, repeat: int = 5) -> float:
+    '''Returns the best per call time in seconds over repeat runs of about 0.2s'''
+    timer = Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+def run(benches: dict, pattern: str = "", repeat: int = 5) -> dict[str, float]:
+    '''Times every bench whose name contains pattern, printing as it goes'''
+    results = {}
+    for name, setup in benches.items():
+        if pattern in name:
+            results[name] = measure(setup(), repeat)
+            print(f"{name:32} {results[name] * 1e6:12.3f} us {1 / results[name]:14,.0f} /s")
+    return results
+
+def regressions(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    '''Returns a line for every result more than threshold (a fraction) slower than the baseline
+    >>> regressions({"a": 1.3e-6, "b": 1e-6, "c": 5e-6}, {"a": 1e-6, "b": 1e-6}, 0.25)
+    ['a: 1.000us -> 1.300us (+30%)']
+    '''
+    slower = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            slower.append(f"{name}: {baseline[name] * 1e6:.3f}us -> {seconds * 1e6:.3f}us (+{seconds / baseline[name] - 1:.0%})")
+    return slower
+
+def soak(games: int, num_players: int = 2, every: int = 1000):
+    '''Plays games greedy games on one engine reset between games. Yields, every so many games, the
+    games played, memory blocks allocated (sys.getallocatedblocks), objects tracked by the garbage
+    collector and the phases the engine built and reused. Once the caches are full the first two stay flat
+
+    >>> rows = list(soak(4, every = 2))
+    >>> [row[0] for row in rows], rows[-1][3] > 0
+    ([2, 4], True)
+    '''
+    engine = Engine([GreedyController() for _ in range(num_players)], seed = 0)
+    for game in range(1, games + 1):
+        engine.reset(seed = game)
+        engine.play_game(max_turns = 500)
+        if game % every == 0 or game == games:
+            gc.collect()
+            yield game, sys.getallocatedblocks(), len(gc.get_objects()), engine.phase_pool.created, engine.phase_pool.reused
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description = "Phase Ten benchmarks")
+    parser.add_argument("--filter", default = "", help = "only run benchmarks whose name contains this")
+    parser.add_argument("--sweep", action = "store_true", help = "also run the player count / phase size sweep")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--out", help = "write the results as JSON")
+    parser.add_argument("--baseline", help = "JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type = float, default = 0.25, help = "allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--soak", type = int, metavar = "GAMES", help = "instead, play this many games on one engine and report memory")
+    args = parser.parse_args()
+    if args.soak:
+        start = perf_counter()
+        for games, blocks, objects, created, reused in soak(args.soak):
+            print(f"{games:10,} games {games / (perf_counter() - start):8.1f}/s  blocks {blocks:10,}  objects {objects:9,}  "
+                  f"phases built {created:4}  reused {reused:12,}")
+        sys.exit(0)
+    results = run(BENCHES | (SWEEP if args.sweep else {}), args.filter, args.repeat)
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "seconds": results}, file, indent = 1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = regressions(results, json.load(file)["seconds"], args.threshold)
+        for line in slower:
+            print("REGRESSION", line)
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,346 @@
+'''Computer players: a greedy rule based Controller and a time budgeted Monte Carlo tree search Controller'''
+from math import log, sqrt
+from multiprocessing import Pool
+from random import Random
+from time import time
+from card import POOL, DECK_IDS, NUM_IDS, VALS, COLOR_VALS
+from stack import Hand, Phase
+from engine import Engine, Controller, Player, Step
+from solver import solve, can_complete, parse
+
+def fits(phase: Phase, card) -> bool:
+    '''Returns True if card alone can extend phase'''
+    phase.push(card)
+    verified = phase.is_phase()
+    phase.pop()
+    return verified
+
+def _profile(hand: Hand) -> tuple[list[int], list[int]]:
+    '''Counts the hand's number cards by face (1-12) and by color'''
+    faces, colors = [0] * 13, [0] * 6
+    for num in hand.ids:
+        if 1 <= VALS[num] <= 12:
+            faces[VALS[num]] += 1
+            colors[COLOR_VALS[num]] += 1
+    return faces, colors
+
+def usefulness(nums: set[int], parts: list[tuple[str, int]], faces: list[int], colors: list[int]) -> dict[int, float]:
+    '''Scores how much each card (by id) helps towards the parts of a phase, roughly 0 to 1,
+    given the hand's profile (see _profile)'''
+    by_face = [0.0] * 13
+    by_color = [0.0] * 6
+    for kind, size in parts:
+        if kind == "set":
+            for face in range(1, 13):
+                by_face[face] = max(by_face[face], faces[face] / size)
+        elif kind == "color":
+            for color in range(6):
+                by_color[color] = max(by_color[color], colors[color] / size)
+        else:
+            held = [0] + [faces[face] > 0 for face in range(1, 13)] + [0] * size
+            windows = {start: sum(held[max(0, start):start + size]) for start in range(2 - size, 13)}
+            for face in {VALS[num] for num in nums if 1 <= VALS[num] <= 12}:
+                score = max([windows[start] for start in range(face - size + 1, face + 1)]) / size
+                by_face[face] = max(by_face[face], score - 0.5 * (faces[face] > 1)) # a second copy never helps a run
+    scores = {}
+    for num in nums:
+        if VALS[num] == 25:
+            scores[num] = 2.0
+        elif VALS[num] == 15:
+            scores[num] = -1.0
+        elif 1 <= VALS[num] <= 12:
+            scores[num] = max(by_face[VALS[num]], by_color[COLOR_VALS[num]])
+        else:
+            scores[num] = 0.0
+    return scores
+
+def discard_order(hand: Hand, phase_strs: list[str], out: bool, playable: list[int] = None) -> list[int]:
+    '''Returns the ids of the cards in hand, the one a greedy player would rather discard first. Once out,
+    skips go first and, given playable (see Engine.playable), cards no tabled phase takes before the rest'''
+    candidates = {num for num in hand.ids}
+    if out:
+        return sorted(candidates, key = lambda num: (VALS[num] != 15, playable is not None and playable[num] != 0,
+                                                     VALS[num] == 25, -VALS[num]))
+    scores = usefulness(candidates, [parse(phs_str) for phs_str in phase_strs], *_profile(hand))
+    return sorted(candidates, key = lambda num: (scores[num], -VALS[num]))
+
+class GreedyController(Controller):
+    '''Plays its phase as soon as the solver finds it, extends everything it can and
+    discards the card that helps its phase the least'''
+
+    def ranked(self, engine: Engine, player: Player) -> list[int]:
+        '''Returns the ids of the cards in hand, the one this player would rather discard first'''
+        return discard_order(player.cards, engine.phases[player.phase], player.out, engine.playable)
+
+    def worst_card(self, engine: Engine, player: Player) -> int:
+        '''Returns the id of the card this player would discard'''
+        return self.ranked(engine, player)[0]
+
+    def draw(self, engine: Engine, player: Player) -> bool:
+        discard = engine.pickup.discard
+        if discard.is_empty() or discard.top().val == 15:
+            return False
+        top = discard.top()
+        if top.val == 25:
+            return True
+        if player.out:
+            return engine.playable[top.id] != 0
+        phase_strs = engine.phases[player.phase]
+        player.cards.push(top)
+        keep = self.worst_card(engine, player) != top.id or can_complete(player.cards, phase_strs)
+        player.cards.pop()
+        return keep
+
+    def play(self, engine: Engine, player: Player):
+        if not player.out and (phases := solve(player.cards, engine.phases[player.phase])) is not None:
+            engine.complete_phase([[card._repr for card in phase.unchecked.cards] for phase in phases])
+        while player.out and engine.step is Step.PLAY and (extensions := engine.extensions(player)):
+            for index, card_reprs in extensions.items(): # every card that fits a phase goes down at once
+                if engine.step is not Step.PLAY:
+                    break
+                if not engine.extend_phase(index, card_reprs) and len(card_reprs) > 1: # two run ends may want one wild
+                    engine.extend_phase(index, card_reprs[:1])
+
+    def discard(self, engine: Engine, player: Player) -> str:
+        return POOL[self.worst_card(engine, player)]._repr
+
+class View:
+    '''What one seat can see of an Engine: enough to deal out any world consistent with it'''
+
+    def __init__(self, engine: Engine, seat: int):
+        self.seat = seat
+        self.phases = engine.phases
+        self.turn_num = engine.turn_num
+        self.step = engine.step
+        self.players = [(player.phase, player.out, player.points, player.cards.size()) for player in engine.players]
+        self.hand = tuple(engine.players[seat].cards.ids)
+        self.discard = tuple(engine.pickup.discard.ids)
+        self.tabled = [[(phase.phase_str, tuple(phase.ids)) for phase in phase_group] for phase_group in engine.round_phases]
+        counts = [DECK_IDS.count(num) for num in range(NUM_IDS)]
+        for num in self.hand + self.discard + tuple([num for group in self.tabled for _, ids in group for num in ids]):
+            counts[num] -= 1
+        self.unseen = tuple([num for num in range(NUM_IDS) for _ in range(counts[num])])
+
+    def world(self, rng: Random) -> Engine:
+        '''Deals the unseen cards out at random into a greedy-played Engine'''
+        unseen = list(self.unseen)
+        rng.shuffle(unseen)
+        engine = Engine([GreedyController() for _ in self.players], self.phases)
+        for seat, (player, (phase, out, points, size)) in enumerate(zip(engine.players, self.players)):
+            player.phase, player.out, player.points = phase, out, points
+            for num in (self.hand if seat == self.seat else [unseen.pop() for _ in range(size)]):
+                player.cards.push(POOL[num])
+        for num in unseen:
+            engine.pickup.push(POOL[num])
+        for num in self.discard:
+            engine.pickup.discard.push(POOL[num])
+        for group in self.tabled:
+            phases = [Phase(phase_str) for phase_str, _ in group]
+            for phase, (_, ids) in zip(phases, group):
+                for num in ids:
+                    phase.push(POOL[num])
+                phase.merge()
+            engine.round_phases.append(phases)
+        engine.reindex()
+        engine.turn_num, engine.step = self.turn_num, self.step
+        return engine
+
+    def redeal(self, engine: Engine, rng: Random):
+        '''Deals the cards this seat can't see (other hands and the deck) out again at random'''
+        hidden = [player.cards for seat, player in enumerate(engine.players) if seat != self.seat] + [engine.pickup]
+        unseen = [num for stack in hidden for num in stack.ids]
+        rng.shuffle(unseen)
+        for stack in hidden:
+            size = stack.size()
+            stack.load(unseen[-size:] if size else ())
+            del unseen[len(unseen) - size:]
+
+def draw_actions(greedy: GreedyController, engine: Engine, player: Player) -> list[bool]:
+    '''The draw choices (True for the discard), the greedy player's first. A skip is never drawn'''
+    discard = engine.pickup.discard
+    if discard.is_empty() or discard.top().val == 15:
+        return [False]
+    return sorted([True, False], key = lambda action: action != greedy.draw(engine, player))
+
+def discard_actions(greedy: GreedyController, engine: Engine, player: Player, candidates: int) -> list[str]:
+    '''The reprs of the cards worth discarding, the greedy player's favourites first'''
+    return [POOL[num]._repr for num in greedy.ranked(engine, player)[:candidates]]
+
+def info_key(engine: Engine, seat: int) -> tuple:
+    '''What seat can tell its decisions apart by: the step, its hand, the discard's top card and how many
+    cards every player holds and who is out. Decisions with the same key share a Node'''
+    return (engine.step, bytes(sorted(engine.players[seat].cards.ids)), bytes(engine.pickup.discard.ids[-1:]),
+            tuple([(player.cards.size(), player.out) for player in engine.players]))
+
+class Node:
+    '''A decision of the searching seat. Per action it keeps [visits, total reward, and of those the visits
+    and reward added since it was handed to a worker] and the seat's next decisions, by info_key (what
+    happened in between, other players' turns and the deck, is hidden)'''
+    __slots__ = ("actions", "stats", "children")
+
+    def __init__(self, actions: list):
+        self.actions = actions
+        self.stats = {action: [0, 0.0, 0, 0.0] for action in actions}
+        self.children: dict = {action: {} for action in actions}
+
+    def select(self):
+        '''The untried action first, otherwise the one with the best UCB1'''
+        for action in self.actions:
+            if self.stats[action][0] == 0:
+                return action
+        visits = log(sum([stats[0] for stats in self.stats.values()]))
+        return max(self.actions, key = lambda action: self.stats[action][1] / self.stats[action][0] +
+                   sqrt(2 * visits / self.stats[action][0]))
+
+    def best(self, min_visits: int):
+        '''The action with the best mean reward. actions[0] (the greedy choice) is kept unless another
+        action has been tried min_visits times to beat it'''
+        tried = [action for action in self.actions if self.stats[action][0] >= min_visits]
+        if self.actions[0] not in tried:
+            return self.actions[0]
+        return max(tried, key = lambda action: self.stats[action][1] / self.stats[action][0])
+
+def merge(node: Node, searched: Node):
+    '''Adds what a worker found searching a copy of node to node'''
+    for action, (_, _, visits, total) in searched.stats.items():
+        stats = node.stats[action]
+        stats[0] += visits
+        stats[1] += total
+        children = node.children[action]
+        for key, child in searched.children[action].items():
+            merge(children.setdefault(key, Node(child.actions)), child)
+
+def playout(view: View, engine: Engine, root: Node, candidates: int, max_turns: int, deadline: float):
+    '''One iteration of the search in a world dealt from view: goes down the tree by UCB1 from root, adds
+    the first of the seat's decisions not in it, then lets greedy players (the seat included) play on
+    until the round ends, max_turns turns are played or the deadline passes. The reward, 1 if the seat
+    completed its phase less the points it was left holding / 100, is added along the way down'''
+    seat = view.seat
+    player = engine.players[seat]
+    greedy = engine.controllers[seat]
+    node, following, path, expanded, turns = root, None, [], False, 0
+    while engine.step in (Step.DRAW, Step.PLAY) and turns < max_turns and time() < deadline:
+        if engine.turn_num != seat:
+            engine.play_turn()
+            turns += 1
+            continue
+        drawing = engine.step is Step.DRAW
+        actions = draw_actions(greedy, engine, player) if drawing else discard_actions(greedy, engine, player, candidates)
+        action = actions[0]
+        if len(actions) > 1:
+            if following is not None: # the decision after one taken in the tree
+                key = info_key(engine, seat)
+                node = following.get(key)
+                if node is None and not expanded:
+                    node = following[key] = Node(actions)
+                    expanded = True
+                following = None
+            if node is not None:
+                action = node.select()
+                path.append((node, action))
+                following, node = node.children[action], None
+        if drawing:
+            engine.draw(action)
+            greedy.play(engine, player)
+        else:
+            engine.discard(action)
+            turns += 1
+    phase, _, points, _ = view.players[seat]
+    if engine.step in (Step.DRAW, Step.PLAY): # round still going
+        reward = float(player.out) - player.cards.sum() / 100
+    else:
+        reward = float(player.phase > phase) - (player.points - points) / 100
+    for node, action in path:
+        stats = node.stats[action]
+        stats[0] += 1
+        stats[1] += reward
+        stats[2] += 1
+        stats[3] += reward
+
+def search(job: tuple) -> Node:
+    '''Worker: plays out worlds dealt from view through the tree under root until the deadline. Returns root'''
+    view, root, candidates, max_turns, deadline, seed = job
+    rng = Random(seed)
+    engine = view.world(rng)
+    dealt = engine.snapshot() # every playout restores this and redeals the hidden cards
+    while time() < deadline:
+        engine.restore(dealt)
+        view.redeal(engine, rng)
+        playout(view, engine, root, candidates, max_turns, deadline)
+    return root
+
+class MCTSController(Controller):
+    '''Chooses draws and discards by Monte Carlo tree search over determinized worlds (hidden hands and
+    the deck dealt out at random), playing phases greedily. The tree's nodes are the seat's own decisions,
+    told apart by what it can see (see info_key). Playouts run for budget seconds per move, split over
+    workers processes (0 searches in this process). The subtree under the chosen move is kept, so the
+    next decision of the round starts from its statistics when the search reached it
+
+    >>> engine = Engine([MCTSController(budget = 0.02, seed = 1), GreedyController()], seed = 1)
+    >>> engine.play_round(200)
+    True
+    >>> bot = engine.controllers[0]
+    >>> bot.reused > 0, bot.moves >= bot.reused
+    (True, True)
+    '''
+
+    def __init__(self, budget: float = 0.05, workers: int = 0, max_turns: int = 60, candidates: int = 4,
+                 min_visits: int = 3, seed = None):
+        self.budget = budget
+        self.candidates = candidates # discards searched, the greedy player's favourites first
+        self.min_visits = min_visits # an action needs this many playouts to overrule the greedy choice
+        self.workers = workers
+        self.max_turns = max_turns
+        self.rng = Random(seed)
+        self.greedy = GreedyController()
+        self.following: dict[int, dict] = {} # by seat, the decisions after the last move chosen
+        self.moves = self.reused = 0 # searches, and those started from a kept subtree
+        self.pool = None
+
+    def choose(self, engine: Engine, actions: list):
+        '''Searches the current decision (from the kept subtree if it reached it) and returns the action with
+        the best mean reward, see Node.best'''
+        if len(actions) == 1:
+            return actions[0]
+        seat = engine.turn_num
+        following = self.following.pop(seat, {})
+        root = following.get(info_key(engine, seat))
+        self.moves += 1
+        if root is not None and root.actions == actions:
+            self.reused += 1
+        else:
+            root = Node(actions)
+        deadline = time() + self.budget
+        view = View(engine, seat)
+        if self.workers:
+            if self.pool is None:
+                self.pool = Pool(self.workers)
+            jobs = [(view, root, self.candidates, self.max_turns, deadline, self.rng.random()) for _ in range(self.workers)]
+            for searched in self.pool.map(search, jobs):
+                merge(root, searched)
+        else:
+            search((view, root, self.candidates, self.max_turns, deadline, self.rng.random()))
+        choice = root.best(self.min_visits)
+        self.following[seat] = root.children[choice]
+        return choice
+
+    def draw(self, engine: Engine, player: Player) -> bool:
+        return self.choose(engine, draw_actions(self.greedy, engine, player))
+
+    def play(self, engine: Engine, player: Player):
+        self.greedy.play(engine, player)
+
+    def discard(self, engine: Engine, player: Player) -> str:
+        return self.choose(engine, discard_actions(self.greedy, engine, player, self.candidates))
+
+    def round_over(self, engine: Engine):
+        self.following.clear()
+
+    def game_over(self, engine: Engine):
+        self.close()
+
+    def close(self):
+        '''Shuts down the playout workers'''
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -1,4 +1,5 @@
 from enum import Enum
+from functools import lru_cache
 
 class Faces(Enum): # values are used for sorting and scoring at the end of a round
     BACK = -1
@@ -60,40 +61,95 @@ PRINT_COLOR = {Colors.NONE: "",
                Colors.BLUE: BLUE,
                Colors.ANY: "",}
 
+FACES = list(Faces)
+COLORS = list(Colors)
+FACE_INDEX = {face: index for index, face in enumerate(FACES)}
+COLOR_INDEX = {color: index for index, color in enumerate(COLORS)}
+
+def card_id(face: Faces, color: Colors) -> int:
+    '''Returns the small integer id (0-95) shared by every card of this face and color'''
+    return FACE_INDEX[face] * len(COLORS) + COLOR_INDEX[color]
+
 class Card:
-    '''Represents phaseten phasecards'''
-    def __init__(self, face: Faces, color: Colors):
-        self.face = face
-        self.color = color
-        self.val = self.face.value
-        self.color_val = self.color.value
-        self._repr = color.name.lower()[0] + str(face.value) if face not in [Faces.WILD, Faces.SKIP] else face.name.lower()[0]
-        
-    def __str__(self):
-        card = ""
-        card += PRINT_COLOR[self.color] + CARD_TOP_BOT + CLEAR + '\n'
-        card_render = CARD_RENDERS[self.face].split('\n')
-        for card_line in card_render:
-            card += PRINT_COLOR[self.color] + card_line[0] + CLEAR +\
-                    card_line[1:-1] +\
-                    PRINT_COLOR[self.color] + card_line[-1] + CLEAR + '\n'
-        card += PRINT_COLOR[self.color] + CARD_TOP_BOT + CLEAR + '\n'
+    '''Represents phaseten phasecards. Cards are interned: Card(face, color) always
+    returns the one shared instance for that face and color (see POOL)'''
+    __slots__ = ("face", "color", "val", "color_val", "_repr", "id", "lines")
+
+    def __new__(cls, face: Faces, color: Colors):
+        return POOL[card_id(face, color)]
+
+    @classmethod
+    def _create(cls, face: Faces, color: Colors) -> "Card":
+        card = object.__new__(cls)
+        card.face = face
+        card.color = color
+        card.val = face.value
+        card.color_val = color.value
+        card._repr = color.name.lower()[0] + str(face.value) if face not in [Faces.WILD, Faces.SKIP] else face.name.lower()[0]
+        card.id = card_id(face, color)
+        card.lines = card._render()
         return card
 
+    def __reduce__(self): # unpickles / copies back to the pooled instance
+        return (Card, (self.face, self.color))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def _render(self) -> tuple[str, ...]:
+        '''Builds the colored lines of the card once, for the atlas'''
+        border = PRINT_COLOR[self.color] + CARD_TOP_BOT + CLEAR
+        lines = [border]
+        for card_line in CARD_RENDERS[self.face].split('\n'):
+            lines.append(PRINT_COLOR[self.color] + card_line[0] + CLEAR +
+                         card_line[1:-1] +
+                         PRINT_COLOR[self.color] + card_line[-1] + CLEAR)
+        lines.append(border)
+        return tuple(lines)
+
+    def __str__(self):
+        return '\n'.join(self.lines) + '\n'
+
     @staticmethod
     def str_cards(cards: list["Card"]):
-        num_cards = len(cards)
-        if num_cards == 0:
-            return ""
-        cards_lines = [str(card).split('\n') for card in cards]
-        num_lines = len(cards_lines[0])
-        return '\n'.join([" ".join([cards_lines[card_num][line_num] 
-                                    for card_num in range(num_cards)]) 
-                                    for line_num in range(num_lines)])
+        return Card.str_ids(tuple([card.id for card in cards]))
+
+    @staticmethod
+    @lru_cache(maxsize = 4096)
+    def lines_ids(ids: tuple[int, ...]) -> tuple[str, ...]:
+        '''Returns the lines of a row of cards given by card id (memoized)'''
+        if len(ids) == 0:
+            return ()
+        return tuple([" ".join(card_lines) for card_lines in zip(*[POOL[num].lines for num in ids])]) +\
+               (" " * (len(ids) - 1),)
+
+    @staticmethod
+    @lru_cache(maxsize = 4096)
+    def str_ids(ids: tuple[int, ...]) -> str:
+        '''Returns a row of cards given by card id (memoized)'''
+        return '\n'.join(Card.lines_ids(ids))
 
     def __repr__(self):
         return f"Card({self.face}, {self.color})"
 
+POOL = tuple(Card._create(face, color) for face in FACES for color in COLORS) # indexed by card id
+
+# the 108 card deck: 2 of each number 1-12 in each color, 8 wilds and 4 skips
+DECK_IDS = tuple([card_id(face, color) for face in FACES for color in COLORS
+                  if face.value in range(1, 13) and color.value in range(1, 5) for _ in range(2)] +
+                 [card_id(Faces.WILD, Colors.ANY)] * 8 + [card_id(Faces.SKIP, Colors.NONE)] * 4)
+DECK = tuple(POOL[num] for num in DECK_IDS)
+
+# per card id lookups so containers of ids never have to touch Card objects
+NUM_IDS = len(POOL)
+VALS = tuple(card.val for card in POOL)
+COLOR_VALS = tuple(card.color_val for card in POOL)
+# card repr (ex. "g4", "w") -> ids of the cards typed that way
+REPR_IDS = {card._repr: tuple([num for num in range(NUM_IDS) if POOL[num]._repr == card._repr]) for card in POOL}
+
 if __name__ == "__main__":
     cds = [Card(Faces.TWELVE, Colors.YELLOW),
             Card(Faces.THREE, Colors.BLUE),
@@ -0,0 +1,582 @@
+from enum import Enum, IntEnum
+from random import Random, getrandbits
+from typing import NamedTuple
+from card import POOL, NUM_IDS
+from stack import Pickup, Phase, PhasePool, Hand, phase_spec
+
+PHASES = [["set3", "set3"],
+          ["set3", "run4"],
+          ["set4", "run4"],
+          ["run7"],
+          ["run8"],
+          ["run9"],
+          ["set4", "set4"],
+          ["set7c"],
+          ["set5", "set2"],
+          ["set5", "set3"]]
+
+NO_PLAYABLE = [0] * NUM_IDS
+
+class Step(Enum): # what the engine is waiting on next
+    DEAL = 0
+    DRAW = 1
+    PLAY = 2
+    GAME_OVER = 3
+
+class Event(IntEnum): # opcodes of the engine's event log, each followed by its card ids
+    DRAW_DECK = 96
+    DRAW_DISCARD = 97
+    DISCARD = 98 # card id
+    COMPLETE = 99 # number of groups, then per group: number of cards, card ids
+    EXTEND = 100 # tabled phase index, number of cards, card ids
+# a draw straight followed by a discard logs as one byte: the card id (ids are below DRAW_DECK),
+# plus FROM_DISCARD if the draw came from the discard
+FROM_DISCARD = 0x80
+
+class Snapshot(NamedTuple):
+    '''Immutable copy of an Engine's state (see Engine.snapshot). Stacks that did not change
+    between snapshots share the same frozen copy. The dealer's random stream is not included'''
+    step: Step
+    turn_num: int
+    players: tuple # (phase, out, points, frozen hand, Player.tally()) per player
+    pickup: tuple
+    discard: tuple
+    round_phases: tuple # frozen phases per phase group
+    playable: tuple
+
+class Player:
+    '''Player has a Hand and a Phase to complete'''
+
+    def __init__(self, name: int):
+        self.name = name
+        self.phase = 0
+        self.cards = Hand()
+        self.out = False
+        self.points = 0
+        # this round's statistics: turns taken, times skipped and where cards were drawn from
+        self.turns = self.skipped = self.discard_draws = self.deck_draws = 0
+        # how the last round ended for this player: cards left, points scored and phase completed
+        self.left = self.scored = 0
+        self.completed = False
+
+    def reset(self):
+        '''Back to the start of a game, keeping the hand's buffers'''
+        self.phase = 0
+        self.cards.clear()
+        self.out = False
+        self.points = 0
+        self.new_round()
+        self.left = self.scored = 0
+        self.completed = False
+
+    def has_cards(self):
+        '''Returns True if a player has any cards, returns False otherwise'''
+        return self.cards.size() != 0
+
+    def tally(self) -> tuple:
+        '''The statistics above, in order'''
+        return (self.turns, self.skipped, self.discard_draws, self.deck_draws, self.left, self.scored, self.completed)
+
+    def new_round(self):
+        self.turns = self.skipped = self.discard_draws = self.deck_draws = 0
+
+    def consolidate(self):
+        '''Scores the cards left in hand, then moves a player who went out onto their next phase'''
+        self.left, self.scored, self.completed = self.cards.size(), self.cards.sum(), self.out
+        self.points += self.scored
+        self.cards.clear()
+        if self.out:
+            self.phase += 1
+            self.out = False
+
+class Controller:
+    '''Makes the decisions for a seat of an Engine (subclasses override)'''
+
+    def draw(self, engine: "Engine", player: Player) -> bool:
+        '''Returns True to draw from the discard, False to draw from the deck'''
+        return False
+
+    def play(self, engine: "Engine", player: Player):
+        '''Completes or extends phases through the engine before discarding'''
+
+    def discard(self, engine: "Engine", player: Player) -> str:
+        '''Returns the repr of the card to discard'''
+        return player.cards.top()._repr
+
+    def end_turn(self, engine: "Engine", player: Player):
+        '''Called once a player's turn is over'''
+
+    def round_over(self, engine: "Engine"):
+        '''Called once every player has been scored for the round'''
+
+    def game_over(self, engine: "Engine"):
+        '''Called once a player has completed the last phase'''
+
+class Observer:
+    '''Follows the moves of an Engine it was added to (Engine.observers) as they happen (subclasses override).
+    Observers see every card moved, hidden or not, it is up to them what they keep'''
+
+    def dealt(self, engine: "Engine"):
+        '''Called once the hands are dealt and the first discard flipped'''
+
+    def drew(self, engine: "Engine", player: Player, card_id: int, from_discard: bool):
+        '''Called once player has drawn card_id'''
+
+    def tabled(self, engine: "Engine", player: Player, card_ids: bytes):
+        '''Called once player has laid card_ids down from their hand, completing or extending phases'''
+
+    def discarded(self, engine: "Engine", player: Player, card_id: int):
+        '''Called once player has discarded card_id'''
+
+    def recycled(self, engine: "Engine"):
+        '''Called once the discard (all but the top card) has been shuffled back into the empty deck'''
+
+    def restored(self, engine: "Engine"):
+        '''Called once the engine has been put back to a snapshot'''
+
+    def turn_over(self, engine: "Engine", player: Player):
+        '''Called once player's turn is over, by discarding or going out'''
+
+    def round_over(self, engine: "Engine"):
+        '''Called once every player has been scored for the round'''
+
+class RandomController(Controller):
+    '''Draws and discards at random, never plays a phase'''
+
+    def __init__(self, rng: Random = None):
+        self.rng = rng or Random()
+
+    def draw(self, engine: "Engine", player: Player) -> bool:
+        return self.rng.random() < 0.5
+
+    def discard(self, engine: "Engine", player: Player) -> str:
+        return self.rng.choice(player.cards.cards)._repr
+
+class Engine:
+    '''Headless Phase Ten: Players, Phases, a Pickup and a Discard driven as a state machine.
+    Every action checks the current Step, nothing is printed or read.
+
+    >>> engine = Engine([Controller(), Controller()])
+    >>> engine.deal()
+    >>> engine.step
+    <Step.DRAW: 1>
+    >>> [player.cards.size() for player in engine.players]
+    [10, 10]
+    >>> engine.draw(from_discard = True)
+    True
+    >>> engine.current.cards.size()
+    11
+    >>> engine.discard(engine.current.cards.top()._repr)
+    True
+    >>> engine.step
+    <Step.DRAW: 1>
+    '''
+
+    def __init__(self, controllers: list[Controller], phases: list[list[str]] = PHASES, seed: int = None):
+        self.controllers = controllers
+        self.rng = Random() # deals and reshuffles, so a seed and the log replay a game
+        self.log = bytearray() # every successful action, see Event
+        self.players = [Player(seat + 1) for seat in range(len(controllers))]
+        self.pickup = Pickup()
+        self.phase_pool = PhasePool() # round_phases come from here and go back at the next deal
+        self.round_phases: list[list[Phase]] = []
+        self.playable = [0] * NUM_IDS # per card id, bit i is set if it alone extends the i-th tabled phase
+        self.history: list[tuple] = [] # undo log of do(): snapshot, log size and last byte, dealer state
+        self.observers: list[Observer] = []
+        self.reset(phases, seed)
+
+    def reset(self, phases: list[list[str]] = None, seed: int = None, controllers: list[Controller] = None):
+        '''Starts a new game (with other phases or controllers if given) reusing the players, piles and
+        phases of the last one, so a long running host doesn't build a new engine for every game
+
+        >>> from bots import GreedyController
+        >>> engine = Engine([GreedyController(), GreedyController()], [["set3"], ["run4"]], seed = 1)
+        >>> engine.play_game(200)
+        True
+        >>> hand, log = engine.players[0].cards, bytes(engine.log)
+        >>> engine.reset(seed = 1)
+        >>> engine.play_game(200), engine.players[0].cards is hand, engine.log == log, engine.phase_pool.reused > 0
+        (True, True, True, True)
+        '''
+        if controllers is not None:
+            if len(controllers) != len(self.players):
+                raise ValueError(f"Expected {len(self.players)} controllers, got {len(controllers)}")
+            self.controllers = controllers
+        if phases is not None:
+            self.phases = phases
+            # parsed up front, so a bad custom phase fails here rather than mid-game
+            self.objectives = [" + ".join([phase_spec(phase_str).desc for phase_str in phase_strs]) for phase_strs in phases]
+        self.seed = getrandbits(63) if seed is None else seed
+        self.rng.seed(self.seed)
+        del self.log[:]
+        self.history.clear()
+        for player in self.players:
+            player.reset()
+        self.pickup.reset()
+        self._release_phases()
+        self.turn_num = 0
+        self.step = Step.DEAL
+
+    def _release_phases(self, keep: int = 0):
+        '''Hands the tabled phase groups after the first keep back to the pool'''
+        for phase_group in self.round_phases[keep:]:
+            for phase in phase_group:
+                self.phase_pool.release(phase)
+        del self.round_phases[keep:]
+        self.playable[:] = NO_PLAYABLE
+
+    @property
+    def current(self) -> Player:
+        '''The player whose turn it is'''
+        return self.players[self.turn_num]
+
+    def snapshot(self) -> Snapshot:
+        '''Returns an immutable copy of the game state (controllers aside)'''
+        return Snapshot(self.step, self.turn_num,
+                        tuple([(player.phase, player.out, player.points, player.cards.freeze(), player.tally())
+                               for player in self.players]),
+                        self.pickup.freeze(), self.pickup.discard.freeze(),
+                        tuple([tuple([phase.freeze() for phase in phase_group]) for phase_group in self.round_phases]),
+                        tuple(self.playable))
+
+    def restore(self, snapshot: Snapshot):
+        '''Puts the game back into the state of a snapshot taken from an engine with as many players
+
+        >>> engine = Engine([Controller(), Controller()])
+        >>> engine.deal()
+        >>> before = engine.snapshot()
+        >>> engine.draw(from_discard = False)
+        False
+        >>> engine.restore(before)
+        >>> engine.snapshot() == before, engine.step
+        (True, <Step.DRAW: 1>)
+        '''
+        self.step, self.turn_num = snapshot.step, snapshot.turn_num
+        for player, (player.phase, player.out, player.points, hand, tally) in zip(self.players, snapshot.players):
+            player.cards.thaw(hand)
+            (player.turns, player.skipped, player.discard_draws, player.deck_draws,
+             player.left, player.scored, player.completed) = tally
+        self.pickup.thaw(snapshot.pickup)
+        self.pickup.discard.thaw(snapshot.discard)
+        kept = 0 # groups whose Phase objects are reused
+        for phase_group, frozen_group in zip(self.round_phases, snapshot.round_phases):
+            if len(phase_group) != len(frozen_group):
+                break
+            for phase, frozen in zip(phase_group, frozen_group):
+                phase.thaw(frozen)
+            kept += 1
+        self._release_phases(kept)
+        for frozen_group in snapshot.round_phases[kept:]:
+            phase_group = [self.phase_pool.acquire(frozen[3]) for frozen in frozen_group]
+            for phase, frozen in zip(phase_group, frozen_group):
+                phase.thaw(frozen)
+            self.round_phases.append(phase_group)
+        self.playable[:] = snapshot.playable
+        for observer in self.observers:
+            observer.restored(self)
+
+    def do(self, action: str, *args):
+        '''Performs an action (ex. do("discard", "r3")) so that undo() can take it back'''
+        self.history.append((self.snapshot(), len(self.log), bytes(self.log[-1:]), self.rng.getstate()))
+        return getattr(self, action)(*args)
+
+    def undo(self):
+        '''Takes back the last action performed through do(). The log's last byte is put back too,
+        as a discard straight after a draw rewrites it (see discard())
+
+        >>> import replay
+        >>> engine = Engine([Controller(), Controller()], seed = 3)
+        >>> engine.deal()
+        >>> engine.do("draw", False)
+        False
+        >>> log = bytes(engine.log)
+        >>> engine.do("discard", engine.current.cards.cards[0]._repr)
+        True
+        >>> engine.undo()
+        >>> bytes(engine.log) == log
+        True
+        >>> engine.discard(engine.current.cards.cards[-1]._repr)
+        True
+        >>> replay.loads(replay.dumps(engine)).log == engine.log
+        True
+        '''
+        snapshot, log_size, last, rng_state = self.history.pop()
+        self.restore(snapshot)
+        self.log[log_size - len(last):] = last
+        self.rng.setstate(rng_state)
+
+    def _expect(self, step: Step):
+        if self.step is not step:
+            raise RuntimeError(f"Expected {step.name}, engine is at {self.step.name}")
+
+    def inc_turn(self):
+        self.turn_num = (self.turn_num + 1) % len(self.players)
+
+    def tabled(self) -> list[Phase]:
+        '''Returns every phase on the table in the order they were laid down'''
+        return [phase for phase_group in self.round_phases for phase in phase_group]
+
+    def _index(self, index: int, before: tuple[int, ...], after: tuple[int, ...]):
+        '''Moves the index-th tabled phase's bit in playable from the cards it accepted to the ones it accepts'''
+        bit = 1 << index
+        for num in before:
+            self.playable[num] &= ~bit
+        for num in after:
+            self.playable[num] |= bit
+
+    def reindex(self):
+        '''Rebuilds playable from the tabled phases (after round_phases was set by hand)'''
+        self.playable[:] = NO_PLAYABLE
+        for index, phase in enumerate(self.tabled()):
+            self._index(index, (), phase.accepted)
+
+    def extensions(self, player: Player = None) -> dict[int, list[str]]:
+        '''Returns, by tabled phase index, the reprs of the cards in player's hand (the current player's
+        by default) that alone extend that phase. Read straight off playable, no phase is tried
+
+        >>> engine = Engine([Controller(), Controller()], [["set1"]], seed = 3)
+        >>> engine.deal()
+        >>> engine.draw(from_discard = False)
+        False
+        >>> hand = engine.current.cards
+        >>> engine.complete_phase([[hand.cards[0]._repr]])
+        True
+        >>> face = engine.tabled()[0].cards[0].val
+        >>> {hand.cards[hand.find(card_repr)].val for card_repr in engine.extensions().get(0, [])} <= {face, 25}
+        True
+        '''
+        hand = (player or self.current).cards
+        found: dict[int, list[str]] = {}
+        for num in set(hand.ids):
+            bits = self.playable[num]
+            while bits:
+                index = (bits & -bits).bit_length() - 1
+                found.setdefault(index, []).extend([POOL[num]._repr] * hand.counts[num])
+                bits &= bits - 1
+        return found
+
+    def deal(self):
+        '''Shuffles a new deck, deals 10 cards to every player and flips the first discard'''
+        self._expect(Step.DEAL)
+        self._release_phases()
+        self.pickup.shuffle(self.rng)
+        for player in self.players:
+            player.new_round()
+        for _ in range(10):
+            for player in self.players:
+                player.cards.push(self.pickup.pop())
+        self.pickup.discard.clear()
+        self.pickup.discard.push(self.pickup.pop())
+        self.step = Step.DRAW
+        for observer in self.observers:
+            observer.dealt(self)
+
+    def draw(self, from_discard: bool) -> bool:
+        '''Current player draws a card. Returns True if it came from the discard
+        (an empty discard falls back to the deck)'''
+        self._expect(Step.DRAW)
+        player = self.current
+        from_discard = from_discard and not self.pickup.discard.is_empty()
+        player.turns += 1
+        if from_discard:
+            player.discard_draws += 1
+            card = self.pickup.discard.pop()
+        else:
+            player.deck_draws += 1
+            if self.pickup.is_empty():
+                self.pickup.discard.recycle(self.pickup, self.rng)
+                for observer in self.observers:
+                    observer.recycled(self)
+            card = self.pickup.pop()
+        player.cards.push(card)
+        self.log.append(Event.DRAW_DISCARD if from_discard else Event.DRAW_DECK)
+        self.step = Step.PLAY
+        for observer in self.observers:
+            observer.drew(self, player, card.id, from_discard)
+        return from_discard
+
+    def _movable(self, card_reprs: list[str]) -> bool:
+        '''Returns True if card_reprs is a list of card reprs no longer than the current hand, checked
+        before any card leaves the hand'''
+        return (isinstance(card_reprs, (list, tuple)) and len(card_reprs) <= self.current.cards.size()
+                and all([isinstance(card_repr, str) for card_repr in card_reprs]))
+
+    def _fill(self, phase: Phase, card_reprs: list[str]) -> bytes:
+        '''Moves the cards from the current hand into phase. Returns the count and ids of the cards
+        moved (for the log) or None if any card is missing'''
+        hand = self.current.cards
+        moved = bytearray([len(card_reprs)])
+        for card_repr in card_reprs:
+            if (card := hand.remove(card_repr)) is None:
+                return None
+            phase.push(card)
+            moved.append(card.id)
+        return moved
+
+    def complete_phase(self, groups: list[list[str]]) -> bool:
+        '''Current player lays down their phase, one group of card reprs per part of the phase.
+        Returns True on success, otherwise every card goes back to the hand
+
+        >>> engine = Engine([Controller(), Controller()], seed = 3)
+        >>> engine.deal()
+        >>> engine.draw(from_discard = False)
+        False
+        >>> engine.complete_phase([[engine.current.cards.cards[0]._repr], [1]]), engine.current.cards.size()
+        (False, 11)
+        '''
+        self._expect(Step.PLAY)
+        player = self.current
+        phase_strs = self.phases[player.phase]
+        if player.out or not isinstance(groups, (list, tuple)) or len(groups) != len(phase_strs):
+            return False
+        if not all([self._movable(group) for group in groups]):
+            return False
+        phases = [self.phase_pool.acquire(phs_str) for phs_str in phase_strs]
+        moved = [self._fill(phase, group) for phase, group in zip(phases, groups)]
+        if None not in moved and all([phase.is_phase() for phase in phases]):
+            self.log += bytes([Event.COMPLETE, len(moved)]) + b"".join(moved)
+            player.out = True
+            first = len(self.tabled())
+            for index, phase in enumerate(phases, first):
+                phase.merge()
+                self._index(index, (), phase.accepted)
+            self.round_phases.append(phases)
+            for observer in self.observers:
+                observer.tabled(self, player, b"".join([ids[1:] for ids in moved]))
+            self._check_out()
+            return True
+        for phase in phases:
+            phase.return_cards(player.cards)
+            self.phase_pool.release(phase)
+        return False
+
+    def extend_phase(self, index: int, card_reprs: list[str]) -> bool:
+        '''Current player adds cards to the index-th tabled phase. Returns True on success,
+        otherwise the cards go back to the hand. At least one card has to be added
+
+        >>> engine = Engine([Controller(), Controller()], [["set1"]], seed = 3)
+        >>> engine.deal()
+        >>> engine.draw(from_discard = False)
+        False
+        >>> engine.complete_phase([[engine.current.cards.cards[0]._repr]])
+        True
+        >>> engine.extend_phase(0, []), engine.extend_phase(-1, ["w"]), len(engine.log)
+        (False, False, 5)
+        '''
+        self._expect(Step.PLAY)
+        player = self.current
+        tabled = self.tabled()
+        if not player.out or not isinstance(index, int) or not 0 <= index < len(tabled):
+            return False
+        if not card_reprs or not self._movable(card_reprs):
+            return False
+        phase = tabled[index]
+        if (moved := self._fill(phase, card_reprs)) is not None and phase.is_phase():
+            self.log += bytes([Event.EXTEND, index]) + moved
+            before = phase.accepted
+            phase.merge()
+            self._index(index, before, phase.accepted)
+            for observer in self.observers:
+                observer.tabled(self, player, bytes(moved[1:]))
+            self._check_out()
+            return True
+        phase.return_cards(player.cards)
+        return False
+
+    def discard(self, card_repr: str) -> bool:
+        '''Current player ends their turn by discarding. Returns False if the card is not in hand.
+        A skip skips the next player, unless it was the discarder's last card
+
+        >>> from card import Card, Faces, Colors
+        >>> engine = Engine([Controller() for _ in range(3)], seed = 1)
+        >>> engine.deal()
+        >>> engine.draw(from_discard = False)
+        False
+        >>> engine.current.cards.clear()
+        >>> engine.current.cards.push(Card(Faces.SKIP, Colors.NONE))
+        >>> engine.discard("s"), engine.step, [player.left for player in engine.players]
+        (True, <Step.DEAL: 0>, [0, 10, 10])
+        >>> engine.turn_num, [player.skipped for player in engine.players]
+        (0, [0, 0, 0])
+        '''
+        self._expect(Step.PLAY)
+        player = self.current
+        if (card := player.cards.remove(card_repr)) is None:
+            return False
+        if self.log and self.log[-1] in (Event.DRAW_DECK, Event.DRAW_DISCARD): # nothing played since drawing
+            self.log[-1] = card.id | (FROM_DISCARD if self.log[-1] == Event.DRAW_DISCARD else 0)
+        else:
+            self.log += bytes([Event.DISCARD, card.id])
+        self.pickup.discard.push(card)
+        for observer in self.observers:
+            observer.discarded(self, player, card.id)
+        if self._check_out(player):
+            return True
+        if card.val == 15:
+            self.inc_turn()
+            self.current.skipped += 1
+        self.inc_turn()
+        self.step = Step.DRAW
+        for observer in self.observers:
+            observer.turn_over(self, player)
+        return True
+
+    def _check_out(self, player: Player = None) -> bool:
+        '''Ends the turn and the round if player (the current player by default) is out of cards'''
+        player = player or self.current
+        if player.has_cards():
+            return False
+        for scored in self.players:
+            scored.consolidate()
+        self.step = Step.GAME_OVER if self.game_over() else Step.DEAL
+        for observer in self.observers:
+            observer.turn_over(self, player)
+            observer.round_over(self)
+        return True
+
+    def game_over(self) -> bool:
+        '''Returns True if any player has beaten every phase'''
+        return any([player.phase == len(self.phases) for player in self.players])
+
+    def standings(self) -> list[Player]:
+        '''Players ordered from winner to loser'''
+        return sorted(self.players, key = lambda player: player.points)
+
+    def play_turn(self):
+        '''Lets the current player's controller take a whole turn'''
+        player = self.current
+        controller = self.controllers[self.turn_num]
+        if self.step is Step.DRAW: # otherwise resuming a turn that has drawn already
+            self.draw(controller.draw(self, player))
+        controller.play(self, player)
+        if self.step is Step.PLAY and not self.discard(controller.discard(self, player)):
+            raise ValueError(f"Player {player.name} discarded a card they do not have")
+        controller.end_turn(self, player)
+
+    def play_round(self, max_turns: int = None) -> bool:
+        '''Deals (unless resuming a round) and plays until a player goes out.
+        Returns False if max_turns ran out first'''
+        if self.step is Step.DEAL:
+            self.deal()
+        turns = 0
+        while self.step in (Step.DRAW, Step.PLAY):
+            if max_turns is not None and turns == max_turns:
+                return False
+            self.play_turn()
+            turns += 1
+        for controller in dict.fromkeys(self.controllers): # a controller may play several seats
+            controller.round_over(self)
+        return True
+
+    def play_game(self, max_turns: int = None) -> bool:
+        '''Plays rounds until the game is over. Returns False if a round hit max_turns'''
+        while self.step is not Step.GAME_OVER:
+            if not self.play_round(max_turns):
+                return False
+        for controller in dict.fromkeys(self.controllers):
+            controller.game_over(self)
+        return True
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -0,0 +1,236 @@
+'''Differential fuzzing of phase validation. Random and adversarial phase attempts (wilds, skips,
+duplicates, runs against the 1 and 12 ends) are judged by the reference rules below, the original
+list based Phase.is_set / is_run / merge, and by the faster implementations: the incremental Phase
+(including Phase.accepts) and, with NumPy, batch.is_phase. Any disagreement is shrunk to a minimal
+case. Attempts are split into chunks played by worker processes, each chunk from its own seed, and
+every implementation's validations per second are reported
+
+    python fuzz.py --attempts 1000000'''
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+from typing import NamedTuple
+from card import POOL, DECK_IDS, VALS, COLOR_VALS
+from stack import Phase, phase_spec
+
+try:
+    import batch
+except ImportError: # the incremental Phase is still checked
+    batch = None
+
+DISTINCT_IDS = tuple(sorted(set(DECK_IDS)))
+NUMBERS = tuple([num for num in DISTINCT_IDS if 1 <= VALS[num] <= 12])
+WILD = next(num for num in DISTINCT_IDS if VALS[num] == 25)
+SKIP = next(num for num in DISTINCT_IDS if VALS[num] == 15)
+CHUNK = 2000
+KEPT = 5 # mismatches kept per chunk
+
+class Case(NamedTuple):
+    '''A phase attempt: cards already merged into the phase, then cards pushed onto it'''
+    phase_str: str
+    merged: tuple[int, ...]
+    pushed: tuple[int, ...]
+
+def ref_is_set(vals: list[int], color_vals: list[int], size: int, set_type: str) -> bool:
+    if len(vals) < size:
+        return False
+    keys = vals if set_type == "face" else color_vals
+    return len({key for key, val in zip(keys, vals) if val != 25}) == 1 and 15 not in vals
+
+def ref_is_run(vals: list[int], size: int) -> bool:
+    if len(vals) < size:
+        return False
+    card_vals = sorted(vals)
+    num_wilds = card_vals.count(25)
+    expected_val = card_vals[0] + 1
+    for val_index in range(1, len(card_vals) - num_wilds): # the cards between the first value and the wilds
+        curr_val = card_vals[val_index]
+        if curr_val == card_vals[val_index - 1]: # cannot have duplicates
+            return False
+        num_wilds -= curr_val - expected_val # the difference is the number of wilds needed
+        expected_val = curr_val + 1
+    return num_wilds >= 0 and 15 not in vals
+
+def reference(case: Case) -> tuple[bool, tuple[int, ...]]:
+    '''The reference verdict on a case, and the phase's cards (bottom to top) once merged'''
+    merged = tuple(sorted(case.merged[::-1], key = VALS.__getitem__)) # unchecked cards are popped onto the phase
+    ids = case.merged + case.pushed
+    vals = [VALS[num] for num in ids]
+    kind, size, _ = phase_spec(case.phase_str)
+    if kind == "run":
+        valid = ref_is_run(vals, size)
+    else:
+        valid = ref_is_set(vals, [COLOR_VALS[num] for num in ids], size, "face" if kind == "set" else "color")
+    if not valid:
+        return False, merged
+    return True, tuple(sorted(merged + case.pushed[::-1], key = VALS.__getitem__))
+
+def ref_accepts(phase_str: str, merged: tuple[int, ...]) -> tuple[int, ...]:
+    '''The deck's cards that alone extend a merged phase, by trying each of them'''
+    return tuple([num for num in DISTINCT_IDS if reference(Case(phase_str, merged, (num,)))[0]])
+
+def grown(phase_str: str, ids: tuple[int, ...]) -> Phase:
+    phase = Phase(phase_str)
+    for num in ids:
+        phase.push(POOL[num])
+    phase.merge()
+    return phase
+
+def incremental(case: Case, noise: tuple[int, ...] = ()) -> tuple[bool, tuple[int, ...], tuple[int, ...]]:
+    '''The incremental Phase's verdict, cards once merged and accepted cards. noise is pushed and popped
+    first, which must leave no trace'''
+    phase = grown(case.phase_str, case.merged)
+    for num in noise:
+        phase.push(POOL[num])
+    for _ in noise:
+        phase.pop()
+    for num in case.pushed:
+        phase.push(POOL[num])
+    if not phase.is_phase():
+        return False, tuple(phase.ids), ()
+    phase.merge()
+    return True, tuple(phase.ids), tuple(sorted(phase.accepted))
+
+def generate(rng: Random) -> Case:
+    '''A random attempt, most of them built to be close to valid'''
+    kind = rng.choice(("set", "color", "run"))
+    style = rng.random()
+    if style < 0.2: # anything
+        cards = rng.sample(DECK_IDS, rng.randint(1, 14))
+    elif kind == "run":
+        length = rng.randint(1, 12)
+        low = rng.choice((1, 1, 12 - length + 1, 12 - length + 1, rng.randint(1, 12 - length + 1))) # hug the ends
+        cards = [rng.choice([num for num in NUMBERS if VALS[num] == face]) for face in range(low, low + length)]
+        for _ in range(rng.randint(0, 3)): # gaps
+            if cards:
+                cards[rng.randrange(len(cards))] = WILD
+        cards += [WILD] * rng.choice((0, 0, 1, 2, 4))
+    else:
+        key = VALS if kind == "set" else COLOR_VALS
+        target = key[rng.choice(NUMBERS)]
+        matching = [num for num in NUMBERS if key[num] == target]
+        cards = [rng.choice(matching) for _ in range(rng.randint(1, 9))] + [WILD] * rng.choice((0, 0, 1, 3, 8))
+    for _ in range(rng.choice((0, 0, 0, 1, 2))): # strays: a skip, a duplicate, any card
+        cards.append(rng.choice((SKIP, rng.choice(cards) if cards else WILD, rng.choice(DECK_IDS))))
+    rng.shuffle(cards)
+    size = max(1, len(cards) + rng.choice((-3, -1, 0, 0, 0, 1)))
+    split = rng.choice((0, 0, rng.randint(0, len(cards))))
+    phase_str = ("set" if kind != "run" else "run") + str(size) + ("c" if kind == "color" else "")
+    return Case(phase_str, tuple(cards[:split]), tuple(cards[split:]))
+
+def mismatch(case: Case) -> str:
+    '''Returns what the implementations disagree on, or "" if they agree'''
+    valid, ids = reference(case)
+    got_valid, got_ids, accepted = incremental(case, case.pushed[:1] + case.merged[-1:])
+    if got_valid != valid:
+        return f"Phase.is_phase: {got_valid}, reference: {valid}"
+    if got_ids != ids:
+        return f"Phase.merge: {list(got_ids)}, reference: {list(ids)}"
+    if valid and accepted != (expected := ref_accepts(case.phase_str, ids)):
+        return f"Phase.accepts: {list(accepted)}, reference: {list(expected)}"
+    if batch is not None:
+        got_valid = bool(batch.is_phase(batch.histograms([case.merged + case.pushed]), case.phase_str)[0])
+        if got_valid != valid:
+            return f"batch.is_phase: {got_valid}, reference: {valid}"
+    return ""
+
+def shrink(case: Case, fails) -> Case:
+    '''Returns the smallest case still failing (fails(case) is true) found by dropping cards and shrinking
+    the size one step at a time
+
+    >>> case = Case("run9", (1, 2, 3), (SKIP, 4, WILD, 5))
+    >>> shrink(case, lambda case: SKIP in case.pushed) == Case("run1", (), (SKIP,))
+    True
+    '''
+    while True:
+        kind, size, _ = phase_spec(case.phase_str)
+        smaller = [Case(case.phase_str, case.merged[:index] + case.merged[index + 1:], case.pushed)
+                   for index in range(len(case.merged))]
+        smaller += [Case(case.phase_str, case.merged, case.pushed[:index] + case.pushed[index + 1:])
+                    for index in range(len(case.pushed))]
+        if size > 1:
+            smaller.append(case._replace(phase_str = case.phase_str.replace(str(size), str(size - 1), 1)))
+        for candidate in smaller:
+            if fails(candidate):
+                case = candidate
+                break
+        else:
+            return case
+
+def timed(cases: list[Case]) -> dict[str, float]:
+    '''Seconds each implementation takes to validate every case'''
+    seconds = {}
+    start = perf_counter()
+    for case in cases:
+        reference(case)
+    seconds["reference"] = perf_counter() - start
+    phases = [grown(case.phase_str, case.merged) for case in cases]
+    start = perf_counter()
+    for phase, case in zip(phases, cases):
+        for num in case.pushed:
+            phase.push(POOL[num])
+        phase.is_phase()
+    seconds["incremental"] = perf_counter() - start
+    if batch is not None:
+        groups: dict[str, list[tuple[int, ...]]] = {}
+        for case in cases:
+            groups.setdefault(case.phase_str, []).append(case.merged + case.pushed)
+        start = perf_counter()
+        for phase_str, rows in groups.items():
+            width = max([len(row) for row in rows])
+            batch.is_phase(batch.histograms([row + (batch.PAD,) * (width - len(row)) for row in rows]), phase_str)
+        seconds["batch"] = perf_counter() - start
+    return seconds
+
+def run_chunk(job: tuple) -> tuple[int, list[tuple[Case, str]], dict[str, float]]:
+    '''Worker: checks a chunk of cases. Returns how many, the shrunk mismatches and the timings'''
+    seed, chunk, count = job
+    rng = Random(f"{seed}:{chunk}")
+    cases = [generate(rng) for _ in range(count)]
+    found = []
+    for case in cases:
+        if mismatch(case) and len(found) < KEPT:
+            case = shrink(case, lambda case: bool(mismatch(case)))
+            found.append((case, mismatch(case)))
+    return count, found, timed(cases)
+
+def fuzz(attempts: int, chunk: int = CHUNK, workers: int = None, seed: int = 0) -> dict:
+    '''Checks attempts cases over workers processes (0 checks in this process, None uses every core).
+    Returns the mismatches and each implementation's validations per second (per process)
+
+    >>> report = fuzz(3000, chunk = 1000, workers = 0)
+    >>> report["checked"], report["mismatches"], sorted(report["per_second"])[-1]
+    (3000, [], 'reference')
+    '''
+    jobs = [(seed, index, min(chunk, attempts - index * chunk)) for index in range(-(-attempts // chunk))]
+    checked, mismatches, seconds = 0, [], {}
+    pool = Pool(workers) if workers != 0 else None
+    try:
+        for count, found, timings in (pool.imap_unordered(run_chunk, jobs) if pool else map(run_chunk, jobs)):
+            checked += count
+            mismatches += found
+            for name, spent in timings.items():
+                seconds[name] = seconds.get(name, 0.0) + spent
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return {"checked": checked, "mismatches": mismatches,
+            "per_second": {name: checked / spent for name, spent in seconds.items() if spent}}
+
+if __name__ == "__main__":
+    import sys
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description = "Differential fuzzing of phase validation")
+    parser.add_argument("--attempts", type = int, default = 1000000)
+    parser.add_argument("--chunk", type = int, default = CHUNK)
+    parser.add_argument("--workers", type = int, default = None, help = "processes (every core by default)")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    start = perf_counter()
+    report = fuzz(args.attempts, args.chunk, args.workers, args.seed)
+    print(f"{report['checked']} attempts checked in {perf_counter() - start:.1f}s")
+    for name, rate in report["per_second"].items():
+        print(f"{name:12} {rate:14,.0f} validations/s")
+    for case, problem in report["mismatches"]:
+        print(f"MISMATCH {case}: {problem}")
+    sys.exit(1 if report["mismatches"] else 0)
@@ -8,250 +8,291 @@
 # 2024-11-8 Phase class rework (Stack, verification, merge, etc.) misc. tweaks
 # 2024-12-21 Complete refactor - more consistent printing, improved eventloop
 # 2024-12-23 Bug fix, Moved controls.py into main.py
+# 2026-10-18 Moved the rules into engine.py - Game is now the terminal Controller
+# 2026-10-18 Table redraws go through screen.py and only rewrite changed lines
+# 2026-10-18 Empty seats can be filled by computer players (bots.py)
+# 2026-10-18 Games can be saved mid-turn and resumed (python main.py <save file>)
+# 2026-10-18 Per turn / per round timings with --metrics <file> (metrics.py)
+# 2026-10-18 Messages show on a status line and expire on their own instead of pausing the game
+# 2026-10-18 Round and game statistics with --stats <file> (stats.py)
+# 2026-10-18 Phase strings are parsed once (stack.phase_spec), sizes of 10 and up allowed
+# 2026-10-18 Draw and discard advice with --advisor (advisor.py)
 
-from stack import Pickup, Phase, Hand
-from os import system, name as os_name
-from time import sleep
+from stack import Phase, Hand
+from engine import Engine, Controller, Player, Step
+from bots import MCTSController
+from screen import Screen, Status, Keyboard
+from metrics import METRICS, TurnMetrics
+from stats import Recorder
+from advisor import Advisor
+import replay
+
+SCREEN = Screen()
+STATUS = Status()
+KEYBOARD = Keyboard()
 
 def clear():
     '''clears the console / terminal'''
-    if os_name == "nt":
-        system("cls")
-    else:
-        print("\x1b[2J\x1b[H", end="")
-
-def timed_message(prompt: str, seconds: float = 1.0):
-    '''displays specified prompt for a number of seconds'''
-    print(prompt)
-    sleep(seconds)
+    SCREEN.clear()
 
-PHASES = [["set3", "set3"],
-          ["set3", "run4"],
-          ["set4", "run4"],
-          ["run7"],
-          ["run8"],
-          ["run9"],
-          ["set4", "set4"],
-          ["set7c"],
-          ["set5", "set2"],
-          ["set5", "set3"]]
+def timed_message(prompt: str, seconds: float = 1.5):
+    '''displays specified prompt on the status line for a number of seconds, play carries on meanwhile'''
+    STATUS.post(prompt, seconds)
 
-class Player:
-    '''Player has a Hand and Phases'''
-    count = 0
+def draw(text: str):
+    '''redraws the screen as the status line over text'''
+    SCREEN.draw(STATUS.line() + '\n' + text)
 
-    def __init__(self):
-        self.phase = 0
-        self.cards = Hand()
-        self.out = False
-        self.points = 0
-        self.turn_over = True
-        self.name = Player.count + 1
-        Player.count += 1
-
-    def show_space(self, phase: Phase):
-        space = phase.desc() + '\n' + str(phase) + '\n' + str(self.cards)
-        clear()
-        print(space)
+def ask(prompt: str) -> str:
+    '''input() timed as "input". Expired messages are cleared off the status line while waiting'''
+    with METRICS.timer("input"):
+        return KEYBOARD.ask(prompt, STATUS.next_timeout, lambda: SCREEN.update(0, STATUS.line()))
 
-    def has_cards(self):
-        '''Returns True if a player has any cards, returns False otherwise'''
-        return self.cards.size() != 0
+def copy_hand(hand: Hand) -> Hand:
+    '''Returns a scratch Hand holding the same cards'''
+    scratch = Hand()
+    for card in hand.cards:
+        scratch.push(card)
+    return scratch
 
-    def consolidate(self):
-        self.cards.clear()
-        if self.out:
-            self.phase += 1
-            self.out = False
-        self.points += self.cards.sum()
+class Game(Controller):
+    '''Game plays every seat of an Engine from the terminal'''
 
-    def sort(self):
-        '''Player will choose how to sort their hand'''
-        clear()
-        print(self.cards)
-        choices = {'1': lambda: self.cards.face_sort(), 
-                   '2': lambda: self.cards.color_sort()}
-        user_input = input("Press 1 to sort by Face | Press 2 to sort by Color")
-        choices.get(user_input, lambda: timed_message("Invalid Argument"))()
-
-    def do_phase(self, phase: Phase):
-        while True:
-            self.show_space(phase)
-            user_input = input("Which cards would you like to drop? (Enter Q when done) ")
-            if user_input.upper() == 'Q':
-                break
-            elif (index := self.cards.find(user_input)) != -1:
-                phase.push(self.cards.pop(index))
-            else:
-                timed_message("Card not found. (ex. g3 is Green 4; w is Wild)")
-        return phase.is_phase()
-
-    def get_objective(self):
-        return f"Phase {self.phase + 1}: " + " + ".join([Phase.descript(phs_str) for phs_str in PHASES[self.phase]])
-
-class Game:
-    '''Game has Players, Phases, a Pickup, and a Discard'''
-
-    def __init__(self, num_players = ""):
+    def __init__(self, num_players = "", num_bots = "", path = "", recorder = None, advisor = None):
+        self.recorder = recorder # a stats.Recorder, or None
+        self.advisor = advisor # an advisor.Advisor, or None
+        if path:
+            self.load_game(path, num_bots)
+            return
         if not num_players:
             while not num_players.isnumeric() or not ('1' <= num_players <= '4'):
                 clear()
-                num_players = input("How many players (1-4): ")
-        self.new_game(int(num_players))
+                num_players = ask("How many players (1-4): ")
+        max_bots = 4 - int(num_players)
+        while max_bots and not (num_bots.isnumeric() and int(num_bots) <= max_bots):
+            clear()
+            num_bots = ask(f"How many computer players (0-{max_bots}): ")
+        self.new_game(int(num_players), int(num_bots or 0))
+
+    def new_game(self, num_players, num_bots = 0):
+        self.engine = Engine([self] * num_players + [MCTSController() for _ in range(num_bots)])
+        self.main_loop()
 
-    def new_game(self, num_players):
-        self.players = [Player() for _ in range(num_players)]
-        self.pickup = Pickup()
-        self.round_phases: list[list[Phase]] = []
-        self.turn_num = 0
+    def load_game(self, path, num_bots = ""):
+        '''Resumes a saved game, the last num_bots seats going to computer players'''
+        self.engine = replay.load(path)
+        num_players = len(self.engine.players)
+        while not (num_bots.isnumeric() and int(num_bots) < num_players):
+            clear()
+            num_bots = ask(f"How many of the {num_players} players are computer players (0-{num_players - 1}): ")
+        humans = num_players - int(num_bots)
+        self.engine.controllers = [self] * humans + [MCTSController() for _ in range(int(num_bots))]
         self.main_loop()
 
-    def inc_turn(self):
-        self.turn_num = (self.turn_num + 1) % len(self.players)
+    def save_game(self):
+        '''Saves the game so it can be resumed from the same point'''
+        path = ask("Save as: ")
+        try:
+            replay.save(self.engine, path)
+            timed_message(f"Saved to {path}")
+        except OSError as error:
+            timed_message(f"Could not save: {error}")
 
-    def deal(self):
-        self.pickup.shuffle()
-        for _ in range(10):
-            for player in self.players:
-                player.cards.push(self.pickup.pop())
-        self.pickup.discard.clear()
-        self.pickup.discard.push(self.pickup.pop())
+    def get_objective(self, player: Player):
+        return f"Phase {player.phase + 1}: " + self.engine.objectives[player.phase]
+
+    def show_space(self, phase: Phase, hand: Hand):
+        with METRICS.timer("render"):
+            space = phase.desc() + '\n' + str(phase) + '\n' + str(hand)
+            draw(space)
+        METRICS.count("frames")
 
     def show_table(self, player: Player):
-        on_table = [f"Player {player.name}'s Turn - {player.get_objective()}"]
-        phases_strs = "\n".join([Phase.str_phases(phase_group) for phase_group in self.round_phases])
+        with METRICS.timer("render"):
+            self.draw_table(player)
+        METRICS.count("frames")
+
+    def draw_table(self, player: Player):
+        on_table = [f"Player {player.name}'s Turn - {self.get_objective(player)}"]
+        phases_strs = "\n".join([Phase.str_phases(phase_group) for phase_group in self.engine.round_phases])
         if phases_strs != "":
             on_table.append(phases_strs)
-        on_table += [str(self.pickup), str(player.cards)]
+        on_table += [str(self.engine.pickup), str(player.cards)]
         table = '\n'.join(on_table)
-        clear()
-        print(table)
+        draw(table)
 
-    def card_from_discard(self, player: Player):
-        if self.pickup.discard.is_empty():
-            timed_message("Discard is empty. Drawing from Deck...")
-            self.card_from_pickup(player)
-        else:
-            player.cards.push(self.pickup.discard.pop())
+    def sort(self, player: Player):
+        '''Player will choose how to sort their hand'''
+        draw(str(player.cards))
+        choices = {'1': lambda: player.cards.face_sort(), 
+                   '2': lambda: player.cards.color_sort()}
+        user_input = ask("Press 1 to sort by Face | Press 2 to sort by Color")
+        choices.get(user_input, lambda: timed_message("Invalid Argument"))()
 
-    def card_from_pickup(self, player: Player):
-        if self.pickup.is_empty():
-            timed_message("Pickup is empty. Reshuffling cards from Discard...")
-            self.pickup.cards = self.pickup.discard.recycle()
-        player.cards.push(self.pickup.pop())
+    def do_phase(self, phase: Phase, hand: Hand) -> list[str]:
+        '''Player moves cards from a scratch hand into phase. Returns the reprs of the cards moved'''
+        dropped = []
+        while True:
+            self.show_space(phase, hand)
+            user_input = ask("Which cards would you like to drop? (Enter Q when done) ")
+            if user_input.upper() == 'Q':
+                break
+            elif (index := hand.find(user_input)) != -1:
+                card = hand.pop(index)
+                phase.push(card)
+                dropped.append(card._repr)
+            else:
+                timed_message("Card not found. (ex. g3 is Green 4; w is Wild)")
+        return dropped
+
+    def advice(self, player: Player, drawing: bool, shown: int = 3) -> str:
+        '''Returns the advisor's best few choices for the prompt, or nothing without an advisor'''
+        if self.advisor is None:
+            return ""
+        with METRICS.timer("advise"):
+            advice = (self.advisor.draws if drawing else self.advisor.discards)(self.engine, player)
+        return " [advice: " + " | ".join([str(choice) for choice in advice[:shown]]) + "]"
 
-    def draw(self, player: Player):
+    def draw(self, engine: Engine, player: Player) -> bool:
         '''player draws a card from a pile'''
+        advice = self.advice(player, True)
         while True:
             self.show_table(player)
-            choice = input("Draw from Discard (1) or Deck (2): ")
+            choice = ask(f"Draw from Discard (1) or Deck (2){advice}: ")
             if choice == "1":
-                self.card_from_discard(player)
+                if engine.pickup.discard.is_empty():
+                    timed_message("Discard is empty. Drawing from Deck...")
+                    return self.card_from_pickup(engine)
+                return True
             elif choice == "2":
-                self.card_from_pickup(player)
-            else:
-                timed_message("Invalid Argument")
-                continue
-            break
+                return self.card_from_pickup(engine)
+            timed_message("Invalid Argument")
+
+    def card_from_pickup(self, engine: Engine) -> bool:
+        if engine.pickup.is_empty():
+            timed_message("Pickup is empty. Reshuffling cards from Discard...")
+        return False
 
-    def drop(self, player: Player):
+    def discard(self, engine: Engine, player: Player) -> str:
         '''player drops a card into a pile'''
+        advice = self.advice(player, False)
         while True:
             self.show_table(player)
-            card_repr = input("Which card would you like to drop?: ")
+            card_repr = ask(f"Which card would you like to drop?{advice}: ")
             if (index := player.cards.find(card_repr)) != -1:
-                card = player.cards.pop(index)
-                if card.val == 15:
-                    self.inc_turn()
+                if player.cards.cards[index].val == 15:
                     timed_message("The next player will be skipped.")
-                self.pickup.discard.push(card)
-                player.turn_over = True
-                break
-            else:
-                timed_message("Card not found. (ex. g3 is Green 4; w is Wild)")
+                return card_repr
+            timed_message("Card not found. (ex. g3 is Green 4; w is Wild)")
 
     def complete_phase(self, player: Player):
         '''Will determine player phases and let them drop into there, if completed those phases will be returned'''
         if player.out:
             timed_message("You have already completed your phase! Try extending another phase.")
             return
-        phases = [Phase(phs_str) for phs_str in PHASES[player.phase]]
-        incomplete = False
-        for phase in phases:
-            if not player.do_phase(phase):
-                incomplete = True
+        hand = copy_hand(player.cards)
+        groups = []
+        for phs_str in self.engine.phases[player.phase]:
+            phase = Phase(phs_str)
+            groups.append(self.do_phase(phase, hand))
+            if not phase.is_phase():
                 break
-        if not incomplete: 
+        with METRICS.timer("validate"):
+            completed = len(groups) == len(self.engine.phases[player.phase]) and self.engine.complete_phase(groups)
+        if completed:
             timed_message("Phase Success.")
-            player.out = True
-            for phase in phases:
-                phase.merge()
-            self.round_phases.append(phases)
         else:
             timed_message("Phase Failure.")
-            for phase in phases:
-                phase.return_cards(player.cards)
 
     def extend_phase(self, player: Player):
-        '''Will loop through any phase to extend'''
+        '''Will loop through the phases that a card in hand can extend'''
         if not player.out:
             timed_message("You must first complete your phase to extend another phase.")
             return
-        for phase in [phase for phase_group in self.round_phases for phase in phase_group]:
-            if player.do_phase(phase):
-                print("Phase Success.")
-                phase.merge()
+        extensions = self.engine.extensions(player)
+        if not extensions:
+            timed_message("None of your cards can extend a phase.")
+            return
+        for index in sorted(extensions):
+            tabled = self.engine.tabled()[index]
+            phase = Phase(tabled.phase_str)
+            for card in tabled.cards:
+                phase.push(card)
+            dropped = self.do_phase(phase, copy_hand(player.cards))
+            with METRICS.timer("validate"):
+                extended = self.engine.extend_phase(index, dropped)
+            if extended:
+                timed_message("Phase Success.")
             else:
-                print("Phase Failure.")
-                phase.return_cards(player.cards)
-
-    def game_over(self) -> bool:
-        '''Displays round results. Returns True if game is over, returns False otherwise'''
-        for player in self.players:
-            player.name
-        return any([player.phase == len(PHASES) for player in self.players])
+                timed_message("Phase Failure.")
+            if self.engine.step is not Step.PLAY:
+                break
 
-    def do_turn(self, player: Player) -> bool:
-        '''Walks through player's turn. Returns False if the player has no cards left, otherwise returns True'''
-        self.draw(player)
-        choices = {'1': lambda: player.sort(),
+    def play(self, engine: Engine, player: Player):
+        '''Walks through player's turn until they choose to drop a card or run out of cards'''
+        choices = {'1': lambda: self.sort(player),
                    '2': lambda: self.complete_phase(player),
                    '3': lambda: self.extend_phase(player),
-                   '4': lambda: self.drop(player)}
-        player.turn_over = False
-        while not player.turn_over and player.has_cards():
+                   '5': lambda: self.save_game()}
+        while engine.step is Step.PLAY:
             self.show_table(player)
-            user_input = input("Press 1 to Sort | Press 2 to Complete Phase | Press 3 to Extend Phase | Press 4 to Drop a Card")
+            user_input = ask("Press 1 to Sort | Press 2 to Complete Phase | Press 3 to Extend Phase | Press 4 to Drop a Card | Press 5 to Save")
+            if user_input == '4':
+                break
             choices.get(user_input, lambda: timed_message("Invalid Argument"))()
-        self.show_table(player)
-        timed_message("Switching Turn" if player.turn_over else "Round Over")
-        return player.has_cards()
+
+    def end_turn(self, engine: Engine, player: Player):
+        if engine.step is Step.DRAW: # a round that ended has been scored already, round_over shows it
+            self.show_table(player)
+        timed_message("Switching Turn" if engine.step is Step.DRAW else "Round Over")
+
+    def round_over(self, engine: Engine):
+        if self.recorder is not None:
+            self.recorder.round(engine)
+        self.round_results()
+        ask("Press Enter to continue...")
+
+    def game_over(self, engine: Engine):
+        if self.recorder is not None:
+            self.recorder.game(engine)
+        self.game_results()
+        ask("Press Enter to continue...")
 
     def main_loop(self):
         '''starts and maintains the state of the game'''
-        while not self.game_over(): # while no player has beaten 10 phases
-            self.deal()
-            while self.do_turn(self.players[self.turn_num]): # while player still has cards
-                self.inc_turn()
-            for player in self.players:
-                player.consolidate()
-            self.round_results()
-            input("Press Enter to continue...")
-        self.game_results()
-        input("Press Enter to continue...")
+        self.engine.observers.append(TurnMetrics(METRICS)) # every seat's turns, bots' included
+        self.engine.play_game()
 
     def round_results(self):
-        '''Prints points of all players and declares a winner'''
+        '''Prints points of all players'''
         clear()
-        for index in range(0, len(self.players)):
-            print(f"Player {self.players[index].name}: {self.players[index].points} points")
+        for player in self.engine.players:
+            print(f"Player {player.name}: {player.points} points")
 
     def game_results(self):
         '''Prints points of all players and declares a winner'''
         self.round_results()
-        self.players.sort(key = lambda player: player.points)
-        winner = self.players[0]
+        winner = self.engine.standings()[0]
         print(f"\nPlayer {winner.name} has won with {winner.points}")
         
 if __name__ == "__main__":
-    g = Game()
\ No newline at end of file
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description = "Phase Ten")
+    parser.add_argument("save", nargs = "?", default = "", help = "resume a saved game")
+    parser.add_argument("--metrics", help = "append per turn and per round timings to this JSON Lines file")
+    parser.add_argument("--profile", action = "store_true", help = "with --metrics, profile every round")
+    parser.add_argument("--stats", help = "append round and game statistics to this file (see stats.py)")
+    parser.add_argument("--advisor", action = "store_true", help = "score the draw and discard choices every turn")
+    args = parser.parse_args()
+    if args.metrics:
+        METRICS.enable(args.metrics, args.profile)
+    recorder = Recorder(args.stats) if args.stats else None
+    advisor = Advisor() if args.advisor else None
+    try:
+        g = Game(path = args.save, recorder = recorder, advisor = advisor)
+    finally:
+        METRICS.disable()
+        if recorder is not None:
+            recorder.close()
+        if advisor is not None:
+            advisor.close()
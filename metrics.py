@@ -0,0 +1,166 @@
+'''Named timers and counters for the game loop, written per turn and per round to a JSON Lines sink,
+with optional cProfile stats per round. Until enable() is called every call returns straight away.
+Turns and rounds are ended by a TurnMetrics observer on the Engine, so every seat's turns are recorded
+whoever plays them
+
+>>> from io import StringIO
+>>> metrics = Metrics()
+>>> with metrics.timer("render"):
+...     pass
+>>> sink = StringIO()
+>>> metrics.enable(sink)
+>>> with metrics.timer("render"):
+...     pass
+>>> metrics.count("frames")
+>>> metrics.turn_end(player = 1)
+>>> metrics.round_end()
+>>> records = [json.loads(line) for line in sink.getvalue().splitlines()]
+>>> [(record["type"], sorted(record["timers"]), record["counters"]) for record in records]
+[('turn', ['render', 'turn'], {'frames': 1}), ('round', ['render', 'turn'], {'frames': 1})]
+'''
+import cProfile
+import json
+from contextlib import nullcontext
+from time import perf_counter
+from engine import Engine, Observer, Player
+
+NULL_TIMER = nullcontext()
+PROFILE_TOP = 15 # functions kept per round, by own time
+
+class Timer:
+    '''Adds the time spent in a with block to a named timer'''
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.name, perf_counter() - self.start)
+
+class Metrics:
+    '''Collects timers (seconds) and counters for the current turn and rolls them up per round'''
+
+    def __init__(self):
+        self.enabled = False
+        self.sink = None
+        self.owned = False # the sink was opened by enable()
+        self.profiler = None
+        self.turn_timers: dict[str, float] = {}
+        self.turn_counters: dict[str, int] = {}
+        self.round_timers: dict[str, float] = {}
+        self.round_counters: dict[str, int] = {}
+        self.rounds = 0
+        self.turns = 0
+        self.turn_start = 0.0
+
+    def enable(self, sink, profile: bool = False):
+        '''Starts collecting into sink, a path (appended to) or a file. profile runs cProfile over every round'''
+        self.owned = isinstance(sink, str)
+        self.sink = open(sink, "a") if self.owned else sink
+        self.enabled = True
+        self.turn_start = perf_counter()
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def disable(self):
+        '''Stops collecting and closes a sink opened by enable()'''
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler = None
+        if self.owned:
+            self.sink.close()
+        self.sink, self.owned = None, False
+        self.enabled = False
+
+    def timer(self, name: str):
+        '''Returns a context manager timing its block under name'''
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name)
+
+    def add(self, name: str, seconds: float):
+        self.turn_timers[name] = self.turn_timers.get(name, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.turn_counters[name] = self.turn_counters.get(name, 0) + amount
+
+    def _write(self, record: dict):
+        self.sink.write(json.dumps(record) + "\n")
+        self.sink.flush()
+
+    def turn_end(self, **fields):
+        '''Writes the turn's timers (and "turn", the time since the last turn ended) and counters'''
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self.add("turn", now - self.turn_start)
+        self._write({"type": "turn", "round": self.rounds, "turn": self.turns, **fields,
+                     "timers": self.turn_timers, "counters": self.turn_counters})
+        for name, seconds in self.turn_timers.items():
+            self.round_timers[name] = self.round_timers.get(name, 0.0) + seconds
+        for name, amount in self.turn_counters.items():
+            self.round_counters[name] = self.round_counters.get(name, 0) + amount
+        self.turn_timers, self.turn_counters = {}, {}
+        self.turns += 1
+        self.turn_start = now
+
+    def round_end(self, **fields):
+        '''Writes the round's totals, and the functions it spent longest in when profiling'''
+        if not self.enabled:
+            return
+        record = {"type": "round", "round": self.rounds, "turns": self.turns, **fields,
+                  "timers": self.round_timers, "counters": self.round_counters}
+        if self.profiler is not None:
+            self.profiler.disable()
+            record["profile"] = top_functions(self.profiler)
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self._write(record)
+        self.round_timers, self.round_counters = {}, {}
+        self.rounds += 1
+        self.turns = 0
+
+def top_functions(profiler: cProfile.Profile, limit: int = PROFILE_TOP) -> list[list]:
+    '''Returns [function, calls, own seconds, cumulative seconds] for the functions with the most own time'''
+    profiler.create_stats()
+    rows = [[f"{file}:{line}({name})", calls, own, total]
+            for (file, line, name), (_, calls, own, total, _) in profiler.stats.items()]
+    return sorted(rows, key = lambda row: -row[2])[:limit]
+
+class TurnMetrics(Observer):
+    '''Ends a turn in metrics after every player's turn and a round after every round
+
+    >>> from io import StringIO
+    >>> from bots import GreedyController
+    >>> metrics, sink = Metrics(), StringIO()
+    >>> metrics.enable(sink)
+    >>> engine = Engine([GreedyController(), GreedyController()], [["set3"]], seed = 2)
+    >>> engine.observers.append(TurnMetrics(metrics))
+    >>> engine.play_round()
+    True
+    >>> metrics.disable()
+    >>> kinds = [json.loads(line)["type"] for line in sink.getvalue().splitlines()]
+    >>> kinds.count("turn") == sum([player.turns for player in engine.players]), kinds[-1], sink.closed
+    (True, 'round', False)
+    '''
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def turn_over(self, engine: Engine, player: Player):
+        self.metrics.turn_end(player = player.name, phase = player.phase, out = player.out)
+
+    def round_over(self, engine: Engine):
+        self.metrics.round_end(points = [player.points for player in engine.players])
+
+METRICS = Metrics() # the game loop's, see main.py
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
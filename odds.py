@@ -0,0 +1,133 @@
+'''Monte Carlo odds of completing a phase within a number of draws, sampled over a process pool'''
+from math import sqrt
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+from card import POOL, DECK_IDS, REPR_IDS
+from stack import Stack, Hand
+from solver import can_complete
+
+Z = 1.96 # 95% confidence
+
+class Odds:
+    '''Estimated probability of completing a phase, with a Wilson confidence interval'''
+
+    def __init__(self, hits: int, samples: int, seconds: float):
+        self.hits = hits
+        self.samples = samples
+        self.seconds = seconds
+        self.p = hits / samples if samples else 0.0
+        self.low, self.high = wilson(hits, samples)
+        self.rate = samples / seconds if seconds else 0.0 # samples per second
+
+    def __repr__(self):
+        return f"Odds({self.p:.4f} [{self.low:.4f}, {self.high:.4f}], {self.samples} samples, {self.rate:,.0f}/s)"
+
+def wilson(hits: int, samples: int) -> tuple[float, float]:
+    '''Returns the Wilson score interval of hits out of samples
+    >>> [round(bound, 3) for bound in wilson(50, 100)]
+    [0.404, 0.596]
+    '''
+    if samples == 0:
+        return 0.0, 1.0
+    p = hits / samples
+    center = (p + Z * Z / (2 * samples)) / (1 + Z * Z / samples)
+    margin = Z * sqrt(p * (1 - p) / samples + Z * Z / (4 * samples * samples)) / (1 + Z * Z / samples)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def deck_card(card_repr: str):
+    '''Returns the deck's card for a card_repr (ex. "g4", "w") or None'''
+    for num in REPR_IDS.get(card_repr, ()):
+        if num in DECK_IDS:
+            return POOL[num]
+    return None
+
+def unseen(hand: Stack, known: list[Stack] = ()) -> list[int]:
+    '''Returns the ids of the deck's cards that are not in hand or any known stack (discard, tabled phases)'''
+    counts = [DECK_IDS.count(num) for num in range(len(POOL))]
+    for stack in [hand, *known]:
+        for num in stack.ids:
+            counts[num] -= 1
+    return [num for num in range(len(POOL)) for _ in range(max(counts[num], 0))]
+
+def _sample(job: tuple) -> int:
+    '''Worker: draws count times from unseen with its own seeded stream, returns the number of hits.
+    Cards are only added, so being able to complete after all draws means completing within them'''
+    hand_ids, phase_strs, unseen_ids, draws, count, seed = job
+    rng = Random(seed)
+    hand = Hand()
+    for num in hand_ids:
+        hand.push(POOL[num])
+    hits = 0
+    for _ in range(count):
+        for num in rng.sample(unseen_ids, draws):
+            hand.push(POOL[num])
+        hits += can_complete(hand, phase_strs)
+        for _ in range(draws):
+            hand.pop()
+    return hits
+
+def phase_odds(hand: Stack, phase_strs: list[str], draws: int, known: list[Stack] = (),
+               samples: int = 100000, ci: float = 0.005, batch: int = 2000,
+               workers: int = None, seed: int = 0, unseen_ids: list[int] = None) -> Odds:
+    '''Estimates the odds that hand completes phase_strs within draws more cards from the unseen deck.
+    Sampling is split into batches, each with its own stream seeded from (seed, batch number), so the
+    result doesn't depend on workers. Stops early once the 95% interval is within +/- ci.
+    workers = 0 samples in this process, None uses every core. unseen_ids (ex. from tracker.CardTracker)
+    replaces working the unseen cards out from hand and known
+
+    >>> hand = Hand()
+    >>> for card_repr in ["r3", "g4", "b5", "y6", "r7", "w"]:
+    ...     hand.push(deck_card(card_repr))
+    >>> phase_odds(hand, ["run7"], 0, workers = 0).p
+    0.0
+    >>> phase_odds(hand, ["run6"], 0, samples = 10, workers = 0).p
+    1.0
+    >>> 0 < phase_odds(hand, ["run7"], 1, workers = 0, seed = 1).p < 1
+    True
+    '''
+    start = perf_counter()
+    if unseen_ids is None:
+        unseen_ids = unseen(hand, known)
+    jobs = ((tuple(hand.ids), phase_strs, unseen_ids, draws, min(batch, samples - index * batch), f"{seed}:{index}")
+            for index in range(-(-samples // batch)))
+    hits = done = 0
+    if workers == 0:
+        results = map(_sample, jobs)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap(_sample, jobs)
+    try:
+        for job_hits in results:
+            hits += job_hits
+            done += min(batch, samples - done)
+            low, high = wilson(hits, done)
+            if (high - low) / 2 <= ci:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return Odds(hits, done, perf_counter() - start)
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from engine import PHASES
+    parser = ArgumentParser(description = "Odds of completing a phase within some draws")
+    parser.add_argument("phase", type = int, help = "phase number (1-10)")
+    parser.add_argument("draws", type = int)
+    parser.add_argument("cards", nargs = "+", help = "cards in hand (ex. g3 is Green 3; w is Wild)")
+    parser.add_argument("--samples", type = int, default = 1000000)
+    parser.add_argument("--ci", type = float, default = 0.001)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    hand = Hand()
+    for card_repr in args.cards:
+        if (card := deck_card(card_repr)) is None:
+            parser.error(f"Card not found: {card_repr}")
+        hand.push(card)
+    phase_strs = PHASES[args.phase - 1]
+    print(f"Phase {args.phase} {phase_strs} within {args.draws} draws:",
+          phase_odds(hand, phase_strs, args.draws, samples = args.samples, ci = args.ci,
+                     workers = args.workers, seed = args.seed))
@@ -0,0 +1,89 @@
+'''Compact binary save files: a header, the dealer's seed and the engine's event log.
+Loading replays the log on a fresh Engine at full speed, nothing is rendered'''
+from struct import Struct
+from card import POOL
+from engine import Engine, Controller, Event, Step, PHASES, FROM_DISCARD
+
+MAGIC = b"P10"
+VERSION = 1
+HEADER = Struct("<3sBBBQ") # magic, version, number of players, custom phases flag, seed
+PHASES_SIZE = Struct("<H")
+
+def _phases_bytes(phases: list[list[str]]) -> bytes:
+    text = "|".join([" ".join(phase_strs) for phase_strs in phases]).encode()
+    return PHASES_SIZE.pack(len(text)) + text
+
+def dumps(engine: Engine) -> bytes:
+    '''Returns a game (finished or not) as bytes'''
+    custom = engine.phases != PHASES
+    header = HEADER.pack(MAGIC, VERSION, len(engine.players), custom, engine.seed)
+    return header + (_phases_bytes(engine.phases) if custom else b"") + bytes(engine.log)
+
+def apply(engine: Engine, events: bytes):
+    '''Performs every event in events on engine, dealing whenever a round starts'''
+    pos = 0
+    while pos < len(events):
+        if engine.step is Step.DEAL:
+            engine.deal()
+        event = events[pos]
+        if event < Event.DRAW_DECK or event & FROM_DISCARD: # a whole turn: draw then discard
+            engine.draw(bool(event & FROM_DISCARD))
+            engine.discard(POOL[event & ~FROM_DISCARD]._repr)
+            pos += 1
+        elif event == Event.DRAW_DECK or event == Event.DRAW_DISCARD:
+            engine.draw(event == Event.DRAW_DISCARD)
+            pos += 1
+        elif event == Event.DISCARD:
+            engine.discard(POOL[events[pos + 1]]._repr)
+            pos += 2
+        elif event == Event.COMPLETE:
+            groups, pos = [], pos + 2
+            for _ in range(events[pos - 1]):
+                groups.append([POOL[num]._repr for num in events[pos + 1:pos + 1 + events[pos]]])
+                pos += 1 + events[pos]
+            engine.complete_phase(groups)
+        elif event == Event.EXTEND:
+            index, size = events[pos + 1], events[pos + 2]
+            engine.extend_phase(index, [POOL[num]._repr for num in events[pos + 3:pos + 3 + size]])
+            pos += 3 + size
+        else:
+            raise ValueError(f"Unknown event {event} at byte {pos}")
+
+def loads(data: bytes, controllers: list[Controller] = None) -> Engine:
+    '''Rebuilds a game from dumps(). Without controllers every seat gets a do-nothing Controller
+
+    >>> from bots import GreedyController
+    >>> engine = Engine([GreedyController(), GreedyController()], seed = 7)
+    >>> engine.play_round()
+    True
+    >>> data = dumps(engine)
+    >>> copy = loads(data)
+    >>> copy.snapshot() == engine.snapshot(), len(data) < 100
+    (True, True)
+    '''
+    magic, version, num_players, custom, seed = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a Phase Ten save file")
+    pos, phases = HEADER.size, PHASES
+    if custom:
+        (size,) = PHASES_SIZE.unpack_from(data, pos)
+        pos += PHASES_SIZE.size
+        phases = [phase_strs.split(" ") for phase_strs in data[pos:pos + size].decode().split("|")]
+        pos += size
+    engine = Engine(controllers or [Controller() for _ in range(num_players)], phases, seed)
+    apply(engine, data[pos:])
+    return engine
+
+def save(engine: Engine, path: str):
+    '''Writes a game to path'''
+    with open(path, "wb") as file:
+        file.write(dumps(engine))
+
+def load(path: str, controllers: list[Controller] = None) -> Engine:
+    '''Reads a game written by save()'''
+    with open(path, "rb") as file:
+        return loads(file.read(), controllers)
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
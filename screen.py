@@ -0,0 +1,157 @@
+import sys
+from os import name as os_name
+from queue import Queue, Empty
+from shutil import get_terminal_size
+from threading import Thread
+from time import monotonic
+
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+MOVE_TO = "\x1b[{};1H"
+CLEAR_LINE_END = "\x1b[K"
+CLEAR_SCREEN_END = "\x1b[J"
+SAVE_CURSOR = "\x1b7"
+RESTORE_CURSOR = "\x1b8"
+
+def enable_ansi():
+    '''Turns on ANSI escape handling in the Windows console (no-op elsewhere)'''
+    if os_name != "nt":
+        return
+    try:
+        from ctypes import windll, byref, c_ulong
+        kernel32 = windll.kernel32
+        handle = kernel32.GetStdHandle(-11) # STD_OUTPUT_HANDLE
+        mode = c_ulong()
+        if kernel32.GetConsoleMode(handle, byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004) # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (ImportError, AttributeError, OSError):
+        pass
+
+class Screen:
+    '''Remembers the last frame drawn and only rewrites the lines that changed
+
+    >>> from io import StringIO
+    >>> screen = Screen(StringIO(), height = 50)
+    >>> screen.draw("a\\nb")
+    >>> screen.stream.getvalue()
+    '\\x1b[2J\\x1b[1;1Ha\\x1b[K\\x1b[2;1Hb\\x1b[K\\x1b[3;1H\\x1b[J'
+    >>> screen.stream.truncate(0), screen.stream.seek(0)
+    (0, 0)
+    >>> screen.draw("a\\nc")
+    >>> screen.stream.getvalue()
+    '\\x1b[2;1Hc\\x1b[K\\x1b[3;1H\\x1b[J'
+    '''
+
+    def __init__(self, stream = None, height: int = None):
+        self.stream = stream # defaults to whatever sys.stdout is at the time of writing
+        self.height = height
+        self.frame: list[str] = []
+        self.bytes_written = 0
+        enable_ansi()
+
+    def write(self, text: str):
+        stream = self.stream or sys.stdout
+        stream.write(text)
+        stream.flush()
+        self.bytes_written += len(text)
+
+    def clear(self):
+        '''Clears the terminal and forgets the last frame'''
+        self.frame = []
+        self.write(CLEAR_SCREEN)
+
+    def draw(self, text: str):
+        '''Draws text from the top left corner, leaving the cursor on the line below it.
+        Anything printed below the last frame (prompts, messages) is wiped'''
+        lines = text.split('\n')
+        height = self.height or get_terminal_size().lines
+        if len(lines) >= height: # the frame would scroll, so rows can't be addressed
+            self.clear()
+            self.write(text + '\n')
+            return
+        out = [] if self.frame else ["\x1b[2J"]
+        for row, line in enumerate(lines):
+            if row >= len(self.frame) or self.frame[row] != line:
+                out.append(MOVE_TO.format(row + 1) + line + CLEAR_LINE_END)
+        out.append(MOVE_TO.format(len(lines) + 1) + CLEAR_SCREEN_END)
+        self.frame = lines
+        self.write(''.join(out))
+
+    def update(self, row: int, line: str):
+        '''Rewrites one row of the last frame in place, leaving the cursor (and a half typed answer) where it is
+
+        >>> from io import StringIO
+        >>> screen = Screen(StringIO(), height = 50)
+        >>> screen.draw("a\\nb")
+        >>> screen.update(0, "x")
+        >>> screen.stream.getvalue().endswith('\\x1b7\\x1b[1;1Hx\\x1b[K\\x1b8'), screen.frame
+        (True, ['x', 'b'])
+        '''
+        if row >= len(self.frame) or self.frame[row] == line:
+            return
+        self.frame[row] = line
+        self.write(SAVE_CURSOR + MOVE_TO.format(row + 1) + line + CLEAR_LINE_END + RESTORE_CURSOR)
+
+class Status:
+    '''Transient messages that show until they expire, without holding up the game
+
+    >>> status = Status()
+    >>> status.post("Invalid Argument", 5.0, now = 0.0)
+    >>> status.post("Phase Success.", 1.0, now = 0.5)
+    >>> status.line(now = 1.0), status.next_timeout(now = 1.0)
+    ('Invalid Argument | Phase Success.', 0.5)
+    >>> status.line(now = 2.0), status.next_timeout(now = 2.0)
+    ('Invalid Argument', 3.0)
+    >>> status.line(now = 9.0), status.next_timeout(now = 9.0)
+    ('', None)
+    '''
+
+    def __init__(self):
+        self.messages: list[tuple[float, str]] = [] # (expiry, text)
+
+    def post(self, text: str, seconds: float = 1.0, now: float = None):
+        self.messages.append(((monotonic() if now is None else now) + seconds, text))
+
+    def line(self, now: float = None) -> str:
+        '''Returns the messages that haven't expired, forgetting the rest'''
+        now = monotonic() if now is None else now
+        self.messages = [(expiry, text) for expiry, text in self.messages if expiry > now]
+        return " | ".join([text for _, text in self.messages])
+
+    def next_timeout(self, now: float = None) -> float:
+        '''Seconds until the next message expires, None if there are none'''
+        now = monotonic() if now is None else now
+        expiries = [expiry for expiry, _ in self.messages if expiry > now]
+        return min(expiries) - now if expiries else None
+
+class Keyboard:
+    '''Reads answers on a background thread, so the screen keeps updating while a prompt waits'''
+
+    def __init__(self):
+        self.prompts: Queue = Queue()
+        self.answers: Queue = Queue()
+        self.thread = None
+
+    def _read(self):
+        while True:
+            prompt = self.prompts.get()
+            try:
+                self.answers.put((input(prompt), None))
+            except BaseException as error: # EOF, interrupts... are raised where ask() was called
+                self.answers.put((None, error))
+
+    def ask(self, prompt: str, timeout = lambda: None, idle = lambda: None) -> str:
+        '''Returns the next line typed after prompt. Whenever timeout() seconds pass first
+        (None waits for the answer), idle() is called and the wait goes on'''
+        if self.thread is None:
+            self.thread = Thread(target = self._read, daemon = True)
+            self.thread.start()
+        self.prompts.put(prompt)
+        while True:
+            try:
+                answer, error = self.answers.get(timeout = timeout())
+            except Empty:
+                idle()
+                continue
+            if error is not None:
+                raise error
+            return answer
@@ -0,0 +1,293 @@
+'''Hosts many Phase Ten tables from one process with asyncio. Every table is an Engine driven
+action by action from its seats' messages, so a table waiting on a player never blocks another.
+
+Clients speak JSON lines over TCP or a Unix socket:
+    -> {"op": "join", "table": "t1", "seats": 2}          the table deals once every seat is taken
+    -> {"op": "draw", "discard": false}
+    -> {"op": "complete", "groups": [["r3", "b3", "w"], ["g7", "g7", "y7"]]}
+    -> {"op": "extend", "index": 0, "cards": ["r3"]}
+    -> {"op": "discard", "card": "s"}
+    <- {"op": "state", "seat": 0, "turn": 1, "step": "DRAW", "result": true, ...}
+       in reply to every action, and to whoever's turn it has become
+    <- {"op": "round", "points": [...], "phases": [...]}   the round is over and the next is dealt
+    <- {"op": "over", "points": [...]}                     the game is over (or a seat left)
+    <- {"op": "error", "message": "..."}
+
+python server.py serve hosts tables, python server.py load measures turns per second and turn
+latency with local bot clients'''
+import asyncio
+import json
+from time import perf_counter
+from card import POOL, DECK_IDS
+from engine import Engine, Controller, Step
+from stack import Hand, Phase
+from solver import solve
+from bots import fits, discard_order
+
+BACKLOG = 4096 # pending connections, a load test opens thousands at once
+DECK_CARDS = {POOL[num]._repr: POOL[num] for num in DECK_IDS}
+
+def card_list(value) -> list[str]:
+    '''Returns value if it is a list of card reprs that could fit in a hand, raises ValueError otherwise'''
+    if not isinstance(value, list) or len(value) > len(DECK_IDS) or not all([isinstance(card, str) for card in value]):
+        raise ValueError("Cards must be a list of card names")
+    return value
+
+class Table:
+    '''A game between seats connected over the network'''
+
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.writers: list[asyncio.StreamWriter] = []
+        self.closed = False # once closed the engine may be serving another table
+
+    def is_full(self) -> bool:
+        return len(self.writers) == len(self.engine.players)
+
+    def state(self, seat: int) -> dict:
+        '''What seat can see of the game'''
+        engine = self.engine
+        player = engine.players[seat]
+        discard = engine.pickup.discard
+        return {"op": "state", "seat": seat, "turn": engine.turn_num, "step": engine.step.name,
+                "phase": engine.phases[min(player.phase, len(engine.phases) - 1)], "out": player.out,
+                "hand": [POOL[num]._repr for num in player.cards.ids],
+                "discard": None if discard.is_empty() else discard.top()._repr,
+                "tabled": [[phase.phase_str, [POOL[num]._repr for num in phase.ids]] for phase in engine.tabled()]}
+
+    def send(self, seat: int, message: dict):
+        self.writers[seat].write(json.dumps(message).encode() + b"\n")
+
+    def broadcast(self, message: dict):
+        for seat in range(len(self.writers)):
+            self.send(seat, message)
+
+    def close(self):
+        self.closed = True
+        for writer in self.writers:
+            writer.close()
+
+    def act(self, seat: int, message: dict):
+        '''Performs seat's action on the engine and tells whoever needs to know'''
+        engine = self.engine
+        if self.closed:
+            raise ValueError("The game is over")
+        if not self.is_full() or seat != engine.turn_num:
+            raise ValueError("Not your turn")
+        op = message["op"]
+        if op == "draw":
+            result = engine.draw(bool(message.get("discard")))
+        elif op == "complete":
+            groups = message["groups"]
+            if not isinstance(groups, list):
+                raise ValueError("Groups must be a list of lists of cards")
+            result = engine.complete_phase([card_list(group) for group in groups])
+        elif op == "extend":
+            index = message["index"]
+            if not isinstance(index, int) or not 0 <= index < len(engine.tabled()):
+                raise ValueError(f"No tabled phase {index}")
+            result = engine.extend_phase(index, card_list(message["cards"]))
+        elif op == "discard":
+            result = engine.discard(str(message["card"]))
+        else:
+            raise ValueError(f"Unknown op {op}")
+        if engine.step is Step.GAME_OVER:
+            self.broadcast({"op": "over", "points": [player.points for player in engine.players]})
+            return
+        if engine.step is Step.DEAL:
+            self.broadcast({"op": "round", "points": [player.points for player in engine.players],
+                            "phases": [player.phase for player in engine.players]})
+            engine.deal()
+        self.send(seat, self.state(seat) | {"result": result})
+        if engine.turn_num != seat:
+            self.send(engine.turn_num, self.state(engine.turn_num))
+
+class Server:
+    '''Seats connections at tables by name and relays their actions'''
+
+    def __init__(self, seed: int = None):
+        self.tables: dict[str, Table] = {}
+        self.seed = seed # tables are seeded seed, seed + 1, ... in the order they open
+        self.opened = 0
+        self.spare: dict[int, list[Engine]] = {} # engines of ended tables by seats, reset for new ones
+
+    def engine(self, size: int) -> Engine:
+        '''An engine for a new table, an ended table's if one is spare'''
+        seed = None if self.seed is None else self.seed + self.opened
+        self.opened += 1
+        if spare := self.spare.get(size):
+            engine = spare.pop()
+            engine.reset(seed = seed)
+            return engine
+        return Engine([Controller() for _ in range(size)], seed = seed)
+
+    def join(self, message: dict, writer: asyncio.StreamWriter) -> tuple[Table, int]:
+        '''Seats a connection, dealing once the table is full'''
+        if message["op"] != "join":
+            raise ValueError("Join a table first")
+        name, size = str(message["table"]), int(message.get("seats", 2))
+        if not 1 <= size <= 6:
+            raise ValueError("A table seats 1 to 6 players")
+        if (table := self.tables.get(name)) is None:
+            table = self.tables[name] = Table(name, self.engine(size))
+        elif table.is_full():
+            raise ValueError(f"Table {name} is full")
+        table.writers.append(writer)
+        if table.is_full():
+            table.engine.deal()
+            for seat in range(size):
+                table.send(seat, table.state(seat))
+        return table, len(table.writers) - 1
+
+    def leave(self, table: Table, seat: int):
+        '''Ends a table when one of its seats disconnects'''
+        if self.tables.get(table.name) is not table:
+            return
+        del self.tables[table.name]
+        if table.engine.step is not Step.GAME_OVER:
+            table.broadcast({"op": "over", "points": [player.points for player in table.engine.players], "left": seat})
+        table.close()
+        self.spare.setdefault(len(table.engine.players), []).append(table.engine)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        '''Serves one connection until it closes or its game ends'''
+        table = seat = None
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                    if table is None:
+                        table, seat = self.join(message, writer)
+                    else:
+                        table.act(seat, message)
+                except (ValueError, KeyError, TypeError, RuntimeError) as error:
+                    writer.write(json.dumps({"op": "error", "message": str(error)}).encode() + b"\n")
+                if table is not None and (table.closed or table.engine.step is Step.GAME_OVER):
+                    break
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            if table is not None:
+                self.leave(table, seat)
+            writer.close()
+
+async def serve(server: Server, host: str = "127.0.0.1", port: int = 7510, path: str = None) -> asyncio.AbstractServer:
+    '''Starts listening on a Unix socket at path, or on host:port'''
+    if path:
+        return await asyncio.start_unix_server(server.handle, path, backlog = BACKLOG)
+    return await asyncio.start_server(server.handle, host, port, backlog = BACKLOG)
+
+def decide(state: dict) -> dict:
+    '''A greedy bot's next action from a state message: plays its phase when the solver finds it,
+    extends one card at a time and discards the card that helps its phase the least'''
+    if state["step"] == "DRAW":
+        return {"op": "draw", "discard": state["discard"] == "w"}
+    hand = Hand()
+    for card_repr in state["hand"]:
+        hand.push(DECK_CARDS[card_repr])
+    if state.get("result") is not False: # a failed play falls through to the discard
+        if not state["out"] and (phases := solve(hand, state["phase"])) is not None:
+            return {"op": "complete", "groups": [[card._repr for card in phase.unchecked.cards] for phase in phases]}
+        if state["out"]:
+            for index, (phase_str, card_reprs) in enumerate(state["tabled"]):
+                phase = Phase(phase_str)
+                for card_repr in card_reprs:
+                    phase.push(DECK_CARDS[card_repr])
+                phase.merge()
+                for card_repr in set(state["hand"]):
+                    if fits(phase, DECK_CARDS[card_repr]):
+                        return {"op": "extend", "index": index, "cards": [card_repr]}
+    return {"op": "discard", "card": POOL[discard_order(hand, state["phase"], state["out"])[0]]._repr}
+
+async def bot(connect, table: str, seats: int, latencies: list[float], deadline: float) -> int:
+    '''Plays a seat of table through the protocol until the game ends or the deadline passes.
+    Appends the time each turn took (turn handed over to discard answered) to latencies.
+    Returns the number of turns played'''
+    reader, writer = await connect()
+    writer.write(json.dumps({"op": "join", "table": table, "seats": seats}).encode() + b"\n")
+    turns, started, last_op = 0, None, None
+    try:
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message["op"] == "error":
+                raise RuntimeError(message["message"])
+            if started is not None and (message["op"] == "round" or last_op == "discard"):
+                latencies.append(perf_counter() - started)
+                turns, started = turns + 1, None
+            if message["op"] == "over":
+                break
+            last_op = None
+            if message["op"] != "state" or message["turn"] != message["seat"]:
+                continue
+            if message["step"] == "DRAW":
+                if perf_counter() >= deadline:
+                    break
+                started = perf_counter()
+            action = decide(message)
+            last_op = action["op"]
+            writer.write(json.dumps(action).encode() + b"\n")
+            await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+    return turns
+
+async def load(tables: int, seats: int, seconds: float, path: str = None, seed: int = None):
+    '''Runs a server and tables * seats bot clients in this process for seconds, then reports
+    turns per second and turn latency'''
+    server = Server(seed)
+    listener = await serve(server, port = 0, path = path)
+    if path:
+        connect = lambda: asyncio.open_unix_connection(path)
+    else:
+        host, port = listener.sockets[0].getsockname()[:2]
+        connect = lambda: asyncio.open_connection(host, port)
+    latencies = []
+    start = perf_counter()
+    turns = await asyncio.gather(*[bot(connect, f"t{index}", seats, latencies, start + seconds)
+                                   for index in range(tables) for _ in range(seats)])
+    elapsed = perf_counter() - start
+    listener.close()
+    await listener.wait_closed()
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+    print(f"{tables} tables, {tables * seats} clients: {sum(turns)} turns in {elapsed:.2f}s = {sum(turns) / elapsed:,.0f} turns/s, "
+          f"turn latency p50 {percentile(0.5):.2f}ms p99 {percentile(0.99):.2f}ms")
+
+def _raise_file_limit():
+    '''Every client and its server side each hold a socket'''
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description = "Phase Ten table server")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    serve_parser = commands.add_parser("serve", help = "host tables")
+    serve_parser.add_argument("--host", default = "127.0.0.1")
+    serve_parser.add_argument("--port", type = int, default = 7510)
+    serve_parser.add_argument("--unix", help = "listen on a Unix socket instead")
+    serve_parser.add_argument("--seed", type = int, default = None)
+    load_parser = commands.add_parser("load", help = "measure a server with local bot clients")
+    load_parser.add_argument("--tables", type = int, default = 500)
+    load_parser.add_argument("--seats", type = int, default = 2)
+    load_parser.add_argument("--seconds", type = float, default = 10.0)
+    load_parser.add_argument("--unix", help = "connect over a Unix socket instead of TCP")
+    load_parser.add_argument("--seed", type = int, default = None)
+    args = parser.parse_args()
+    _raise_file_limit()
+    if args.command == "serve":
+        async def main():
+            listener = await serve(Server(args.seed), args.host, args.port, args.unix)
+            async with listener:
+                await listener.serve_forever()
+        asyncio.run(main())
+    else:
+        asyncio.run(load(args.tables, args.seats, args.seconds, args.unix, args.seed))
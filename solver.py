@@ -0,0 +1,122 @@
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement, product
+from card import POOL, NUM_IDS, VALS, COLOR_VALS
+from stack import Stack, Phase, phase_spec
+
+# natural cards (faces 1-12) are tracked by position in NATURALS, wilds only by how many
+NATURALS = tuple([num for num in range(NUM_IDS) if 1 <= VALS[num] <= 12])
+WILDS = tuple([num for num in range(NUM_IDS) if VALS[num] == 25])
+FACE_SLOTS = {face: tuple([pos for pos, num in enumerate(NATURALS) if VALS[num] == face]) for face in range(1, 13)}
+COLOR_SLOTS = {color: tuple([pos for pos, num in enumerate(NATURALS) if COLOR_VALS[num] == color])
+               for color in sorted({COLOR_VALS[num] for num in NATURALS})}
+ORDER = {"run": 0, "set": 1, "color": 2} # runs branch the most, color sets need no branching when last
+
+def parse(phase_str: str) -> tuple[str, int]:
+    '''Returns the (kind, size) of a phase_str, kind being "set", "color" or "run"
+    >>> parse("set3"), parse("set7c"), parse("run9"), parse("set10")
+    (('set', 3), ('color', 7), ('run', 9), ('set', 10))
+    '''
+    spec = phase_spec(phase_str)
+    return spec.kind, spec.size
+
+def histogram(stack: Stack) -> tuple[tuple[int, ...], int]:
+    '''Returns the count of each natural card (in NATURALS order) and the number of wilds in a stack'''
+    counts = stack.counts
+    return tuple([counts[num] for num in NATURALS]), sum([counts[num] for num in WILDS])
+
+def _picks(slots: tuple[int, ...], counts: tuple[int, ...], k: int, any_slot: bool):
+    '''Yields multisets of k positions out of slots that counts can cover.
+    With any_slot only one (fullest first) pick is made since the positions are interchangeable'''
+    if any_slot:
+        pick = []
+        for pos in sorted(slots, key = lambda pos: -counts[pos]):
+            pick += [pos] * min(counts[pos], k - len(pick))
+        if len(pick) == k:
+            yield tuple(pick)
+        return
+    for pick in combinations_with_replacement([pos for pos in slots if counts[pos]], k):
+        if all([pick.count(pos) <= counts[pos] for pos in set(pick)]):
+            yield pick
+
+def _options(kind: str, size: int, counts: tuple[int, ...], wilds: int, rest: tuple):
+    '''Yields every distinct (positions, wilds used) a part could be made of'''
+    last = len(rest) == 0
+    colorless = not any([part_kind == "color" for part_kind, _ in rest])
+    if kind == "run":
+        for start in range(min(1, 13 - size), max(1, 13 - size) + 1):
+            faces = range(start, start + size)
+            held = [face for face in faces if 1 <= face <= 12 and any([counts[pos] for pos in FACE_SLOTS[face]])]
+            missing = size - len(held)
+            for extra in range(0, (1 if last else wilds - missing + 1)): # held faces given up to wilds
+                if missing + extra > wilds:
+                    break
+                for given_up in combinations(held, extra):
+                    used = [face for face in held if face not in given_up]
+                    for pick in product(*[_picks(FACE_SLOTS[face], counts, 1, colorless) for face in used]):
+                        yield tuple([pos for (pos,) in pick]), missing + extra
+    else:
+        slots = FACE_SLOTS if kind == "set" else COLOR_SLOTS
+        for key in slots:
+            avail = sum([counts[pos] for pos in slots[key]])
+            for k in range(min(size, avail), max(1, size - wilds) - 1, -1):
+                for pick in _picks(slots[key], counts, k, kind == "color" or colorless):
+                    yield pick, size - k
+                if last:
+                    break
+
+@lru_cache(maxsize = 1 << 16)
+def _solve(parts: tuple[tuple[str, int], ...], counts: tuple[int, ...], wilds: int):
+    '''Returns a (positions, wilds used) for each part or None if the parts can't all be made'''
+    if len(parts) == 0:
+        return ()
+    (kind, size), rest = parts[0], parts[1:]
+    for used, wilds_used in _options(kind, size, counts, wilds, rest):
+        remaining = list(counts)
+        for pos in used:
+            remaining[pos] -= 1
+        solved = _solve(rest, tuple(remaining), wilds - wilds_used)
+        if solved is not None:
+            return ((used, wilds_used),) + solved
+    return None
+
+def solve(hand: Stack, phase_strs: list[str]) -> list[Phase]:
+    '''Returns one Phase per phase_str filled (unchecked) with cards of hand that complete it,
+    or None if hand can not complete the phase. hand is left untouched
+
+    >>> from card import Card, Faces, Colors
+    >>> from stack import Hand
+    >>> hand = Hand()
+    >>> for face, color in [(Faces.TWO, Colors.RED), (Faces.TWO, Colors.BLUE), (Faces.FOUR, Colors.RED),
+    ...                     (Faces.FIVE, Colors.GREEN), (Faces.SEVEN, Colors.RED), (Faces.WILD, Colors.ANY)]:
+    ...     hand.push(Card(face, color))
+    >>> solve(hand, ["set3", "run4"]) is None
+    True
+    >>> [phase.unchecked.cards for phase in solve(hand, ["run4"])]
+    [[Card(Faces.TWO, Colors.RED), Card(Faces.FOUR, Colors.RED), Card(Faces.FIVE, Colors.GREEN), Card(Faces.WILD, Colors.ANY)]]
+    >>> [phase.is_phase() for phase in solve(hand, ["set2", "run3"])]
+    [True, True]
+    '''
+    counts, wilds = histogram(hand)
+    parts = [parse(phase_str) for phase_str in phase_strs]
+    order = sorted(range(len(parts)), key = lambda index: (ORDER[parts[index][0]], parts[index][1]))
+    solved = _solve(tuple([parts[index] for index in order]), counts, wilds)
+    if solved is None:
+        return None
+    wild_ids = [num for num in WILDS for _ in range(hand.counts[num])]
+    phases = [Phase(phase_str) for phase_str in phase_strs]
+    for index, (used, wilds_used) in zip(order, solved):
+        for pos in sorted(used):
+            phases[index].push(POOL[NATURALS[pos]])
+        for _ in range(wilds_used):
+            phases[index].push(POOL[wild_ids.pop()])
+    return phases
+
+def can_complete(hand: Stack, phase_strs: list[str]) -> bool:
+    '''Returns True if hand holds the cards to complete every phase_str'''
+    counts, wilds = histogram(hand)
+    parts = sorted([parse(phase_str) for phase_str in phase_strs], key = lambda part: (ORDER[part[0]], part[1]))
+    return _solve(tuple(parts), counts, wilds) is not None
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -1,44 +1,108 @@
-from card import Faces, Colors, Card
-from random import shuffle as _shuffle
+from card import Faces, Colors, Card, POOL, DECK_IDS, NUM_IDS, VALS, COLOR_VALS, REPR_IDS
+from random import Random, shuffle as _shuffle
+from array import array
+from functools import lru_cache
+from typing import NamedTuple
+import re
 
 BLANK = Card(Faces.BLANK, Colors.NONE)
 BACK = Card(Faces.BACK, Colors.NONE)
 
+DECK_ARRAY = array('B', DECK_IDS)
+DECK_COUNTS = [DECK_IDS.count(num) for num in range(NUM_IDS)]
+DECK_TOTAL = sum([VALS[num] for num in DECK_IDS])
+NO_COUNTS = [0] * NUM_IDS
+# the deck's distinct cards by what they can extend (see Phase.accepts)
+WILD_IDS = tuple(sorted({num for num in DECK_IDS if VALS[num] == 25}))
+NUMBER_IDS = tuple(sorted({num for num in DECK_IDS if 1 <= VALS[num] <= 12}))
+FACE_IDS = {val + 1: tuple([num for num in NUMBER_IDS if VALS[num] == val]) for val in range(1, 13)} # keyed as face_mask bits
+COLOR_IDS = {color: tuple([num for num in NUMBER_IDS if COLOR_VALS[num] == color]) for color in range(len(Colors))}
+
 class Stack:
-    '''Represents a generic stack of cards (superclass)'''
+    '''Represents a generic stack of cards (superclass).
+    Cards are stored as a compact array of card ids (see card.POOL) alongside a count
+    of each card id and the running total of their values'''
     def __init__(self):
-        self.cards: list[Card] = []
+        self.ids = array('B')
+        self.counts = [0] * NUM_IDS
+        self.total = 0
+        self._frozen = None # cached freeze(), dropped whenever the stack changes
+
+    @property
+    def cards(self) -> list[Card]:
+        '''The cards in the stack, bottom to top'''
+        return [POOL[num] for num in self.ids]
+
+    @cards.setter
+    def cards(self, cards: list[Card]):
+        self.clear()
+        for card in cards:
+            self.push(card)
+
+    def freeze(self) -> tuple:
+        '''Returns an immutable copy of the stack. An unchanged stack returns the same copy, so
+        snapshots taken between changes share it'''
+        if self._frozen is None:
+            self._frozen = (bytes(self.ids), tuple(self.counts), self.total)
+        return self._frozen
+
+    def thaw(self, frozen: tuple):
+        '''Restores the stack to a copy made by freeze()'''
+        if self._frozen is frozen: # unchanged since
+            return
+        ids, counts, self.total = frozen
+        self.ids = array('B', ids)
+        self.counts = list(counts)
+        self._frozen = frozen
+
+    def load(self, ids):
+        '''Replaces the stack with the cards of the given ids'''
+        self.ids = array('B', ids)
+        self.counts = [0] * NUM_IDS
+        for num in self.ids:
+            self.counts[num] += 1
+        self.total = sum([VALS[num] for num in self.ids])
+        self._frozen = None
 
     def push(self, card: Card):
         '''Adds the card to the top of the stack'''
-        self.cards.append(card)
+        self._frozen = None
+        self.ids.append(card.id)
+        self.counts[card.id] += 1
+        self.total += card.val
     
     def pop(self, index = -1) -> Card:
         '''Returns the top card in the stack whilst also removing it from the stack'''
-        if self.is_empty():
+        if not self.ids:
             return None
-        else:
-            return self.cards.pop(index)
+        self._frozen = None
+        num = self.ids.pop(index)
+        self.counts[num] -= 1
+        self.total -= VALS[num]
+        return POOL[num]
     
     def top(self) -> Card:
         '''Returns the top card in the stack'''
-        return self.cards[-1]
+        return POOL[self.ids[-1]]
 
     def is_empty(self):
         '''Returns True if the stack is empty. Returns False otherwise'''
-        return self.cards == []
+        return not self.ids
     
     def size(self):
         '''Returns the number of cards in the stack'''
-        return len(self.cards)    
+        return len(self.ids)
 
     def clear(self):
         '''removes all cards from the stack'''
-        self.cards = []    
+        del self.ids[:]
+        self.counts[:] = NO_COUNTS
+        self.total = 0
+        self._frozen = None
 
     def __str__(self) -> str:
         '''string representation of a stack (subclasses may override this method)'''
-        return Card.str_cards(self.cards)
+        return Card.str_ids(tuple(self.ids))
 
 class Pickup(Stack):
     '''Pickup is a Stack and has a Discard'''
@@ -46,27 +110,33 @@ class Pickup(Stack):
     class Discard(Stack):
         '''Discard is a Stack'''
 
-        def recycle(self):
-            '''keeps only the top card, returns the rest to be reused'''
-            rest = self.cards[:-1]
+        def recycle(self, stack: Stack, rng: Random = None):
+            '''keeps only the top card, the rest are shuffled (by rng if given) into (empty) stack to be reused.
+            The buffers are swapped rather than copied'''
             top = self.pop()
-            self.cards = [top]
-            _shuffle(rest)
-            return rest
+            stack.ids, self.ids = self.ids, stack.ids
+            stack.counts, self.counts = self.counts, stack.counts
+            stack.total, self.total = self.total, stack.total
+            stack._frozen = None
+            self.push(top)
+            (rng.shuffle if rng else _shuffle)(stack.ids)
 
     def __init__(self):
         super().__init__()
-        self.discard = self.Discard()    
-
-    def shuffle(self):
-        '''creates new shuffled deck of cards: 4 skips, 8 wilds, 2 sets of numbers 1-12 for each color'''
-        self.cards = [Card(face, color) for face in Faces for color in Colors \
-                      if face.value in range(1, 13) and color.value in range(1,5) for _ in range(2)]
-        for _ in range(2):
-            for _ in range(2):
-                self.push(Card(Faces.WILD, Colors.ANY))
-            self.push(Card(Faces.SKIP, Colors.NONE))
-        _shuffle(self.cards)
+        self.discard = self.Discard()
+
+    def reset(self):
+        '''Empties the deck and the discard, keeping their buffers'''
+        self.clear()
+        self.discard.clear()
+
+    def shuffle(self, rng: Random = None):
+        '''creates new shuffled deck of cards (by rng if given): 4 skips, 8 wilds, 2 sets of numbers 1-12 for each color'''
+        self.ids[:] = DECK_ARRAY
+        self.counts[:] = DECK_COUNTS
+        self.total = DECK_TOTAL
+        self._frozen = None
+        (rng.shuffle if rng else _shuffle)(self.ids)
     
     def __str__(self):
         '''will print the top of discard and the back of the pickup'''
@@ -78,22 +148,66 @@ class Hand(Stack):
     '''Represents a player-owned stack of cards'''
     
     def find(self, card_repr: str) -> int:
-        '''Returns the index of the card in a stack via a card's card_repr. Returns -1 if not found'''
-        for index in range(self.size()):
-            if card_repr == self.cards[index]._repr:
-                return index
-        return -1
+        '''Returns the index of the card in a stack via a card's card_repr. Returns -1 if not found.
+        The repr is resolved to card ids and checked against the count vector first, so a miss
+        never scans the hand and a hit is a single search of the id bytes.
+        Finding and removing a card are deliberately O(n) in the hand size: the hand keeps its order,
+        so removing from the middle shifts the cards above anyway, and an index of positions would
+        need the same shift. A hand is a dozen bytes, which that search and pop go over at once
+        >>> hand = Hand()
+        >>> hand.push(Card(Faces.ONE, Colors.RED))
+        >>> hand.push(Card(Faces.WILD, Colors.ANY))
+        >>> hand.find("w"), hand.find("r1"), hand.find("g1"), hand.find("x")
+        (1, 0, -1, -1)
+        '''
+        indexes = [self.ids.index(num) for num in REPR_IDS.get(card_repr, ()) if self.counts[num]]
+        return min(indexes) if indexes else -1
+
+    def remove(self, card_repr: str) -> Card:
+        '''Removes and returns the card via a card's card_repr. Returns None if not found'''
+        if (index := self.find(card_repr)) == -1:
+            return None
+        return self.pop(index)
 
     def face_sort(self):
         '''Sorts cards by face'''
-        self.cards.sort(key = lambda card: card.val) # may modify
+        self.ids = array('B', sorted(self.ids, key = VALS.__getitem__))
+        self._frozen = None
 
     def color_sort(self):
         '''Sorts cards by color'''
-        self.cards.sort(key = lambda card: card.color.value) # may modify
+        self.ids = array('B', sorted(self.ids, key = COLOR_VALS.__getitem__))
+        self._frozen = None
 
     def sum(self) -> int:
-        return sum([card.val for card in self.cards])
+        return self.total
+
+PHASE_STR = re.compile(r"(set|run)([1-9][0-9]*)(c?)")
+
+class PhaseSpec(NamedTuple):
+    '''A phase_str parsed once: its kind ("set", "color" or "run"), size and description'''
+    kind: str
+    size: int
+    desc: str
+
+@lru_cache(maxsize = None)
+def phase_spec(phase_str: str) -> PhaseSpec:
+    '''Returns the (cached) PhaseSpec of a phase_str, any size being allowed
+
+    >>> phase_spec("set3"), phase_spec("set12c").desc, phase_spec("run10").size
+    (PhaseSpec(kind='set', size=3, desc='A Set of 3'), 'A Set of 12 Colors', 10)
+    >>> phase_spec("run3c")
+    Traceback (most recent call last):
+    ValueError: Not a phase: 'run3c'
+    '''
+    match = PHASE_STR.fullmatch(phase_str)
+    if match is None or (match[1] == "run" and match[3]):
+        raise ValueError(f"Not a phase: {phase_str!r}")
+    kind, size = "color" if match[3] else match[1], int(match[2])
+    return PhaseSpec(kind, size, f"A {match[1].title()} of {size}" + (" Colors" if match[3] else ""))
+
+NO_FACES = [0] * 27
+NO_COLORS = [0] * len(Colors)
 
 class Phase(Stack):
     '''Represents a maintained stack according to phase conditions.'''
@@ -102,20 +216,87 @@ class Phase(Stack):
         '''ex phase_str: "set4", "run4", "set4c"'''
         super().__init__()
         self.unchecked = Stack()
+        self.face_counts = [0] * 27 # indexed by val + 1
+        self.color_counts = [0] * len(Colors) # of non-wild cards
+        self.reset(phase_str)
+
+    def reset(self, phase_str: str):
+        '''Empties the phase (both piles) and makes it a phase_str one, keeping its buffers'''
+        self.clear()
+        self.unchecked.clear()
         self.phase_str = phase_str
+        self.spec = phase_spec(phase_str) if phase_str else None
+        # running validation state over both piles, kept up to date by push / pop
         self.num_skips = 0
+        self.num_wilds = 0
+        self.face_mask = 0 # bit val + 1 is set for every face held (wilds aside)
+        self.face_counts[:] = NO_FACES
+        self.num_dups = 0 # non-wild cards sharing a face with another
+        self.color_counts[:] = NO_COLORS
+        self.num_colors = 0
+        self.accepted: tuple[int, ...] = () # ids of the deck's cards that alone extend the merged phase
+
+    def _count(self, card: Card, step: int):
+        '''Adds (step = 1) or removes (step = -1) a card from the validation state'''
+        if card.val == 25:
+            self.num_wilds += step
+            return
+        if card.val == 15:
+            self.num_skips += step
+        face = card.val + 1
+        if step == 1:
+            self.num_dups += self.face_counts[face] > 0
+            self.num_colors += self.color_counts[card.color_val] == 0
+        self.face_counts[face] += step
+        self.color_counts[card.color_val] += step
+        if step == -1:
+            self.num_dups -= self.face_counts[face] > 0
+            self.num_colors -= self.color_counts[card.color_val] == 0
+        if self.face_counts[face]:
+            self.face_mask |= 1 << face
+        else:
+            self.face_mask &= ~(1 << face)
     
     def push(self, card: Card):
         '''Pushes unverified card into the unchecked pile'''
-        if card.val == 15:
-            self.num_skips += 1
+        self._frozen = None
+        self._count(card, 1)
         self.unchecked.push(card)
 
     def pop(self):
+        self._frozen = None
         top_card = self.unchecked.pop()
-        if top_card.val == 15:
-            self.num_skips -= 1
+        self._count(top_card, -1)
         return top_card
+
+    def freeze(self) -> tuple:
+        '''Returns an immutable copy of the phase, its unchecked pile and its validation state'''
+        if self._frozen is None:
+            self._frozen = (bytes(self.ids), tuple(self.counts), self.total, self.phase_str, self.unchecked.freeze(),
+                            self.num_skips, self.num_wilds, self.face_mask, tuple(self.face_counts), self.num_dups,
+                            tuple(self.color_counts), self.num_colors, self.accepted)
+        return self._frozen
+
+    def thaw(self, frozen: tuple):
+        '''Restores the phase to a copy made by freeze()'''
+        if self._frozen is frozen:
+            return
+        (ids, counts, self.total, self.phase_str, unchecked, self.num_skips, self.num_wilds, self.face_mask,
+         face_counts, self.num_dups, color_counts, self.num_colors, self.accepted) = frozen
+        self.spec = phase_spec(self.phase_str) if self.phase_str else None
+        self.ids = array('B', ids)
+        self.counts = list(counts)
+        self.unchecked.thaw(unchecked)
+        self.face_counts = list(face_counts)
+        self.color_counts = list(color_counts)
+        self._frozen = frozen
+
+    @staticmethod
+    def thawed(frozen: tuple) -> "Phase":
+        '''Returns a new Phase restored from a copy made by freeze()'''
+        phase = Phase(frozen[3])
+        phase.thaw(frozen)
+        return phase
     
     def is_phase(self):
         '''Returns True if cards are of phase_str specified. Returns False otherwise.
@@ -135,15 +316,10 @@ class Phase(Stack):
         >>> p1.is_phase()
         False
         '''
-        size = int(self.phase_str[3]) 
-        if "set" in self.phase_str:
-            if self.phase_str[-1] != 'c':
-                verified = self.is_set(size, "face")
-            else:
-                verified = self.is_set(size, "color")
-        else:
-            verified = self.is_run(size)
-        return verified
+        kind, size, _ = self.spec
+        if kind == "run":
+            return self.is_run(size)
+        return self.is_set(size, "face" if kind == "set" else "color")
     
     def merge(self):
         '''Merges .unchecked cards (checked through is_phase()) into the the stack of verified phase cards
@@ -169,7 +345,46 @@ class Phase(Stack):
         '''
         for _ in range(self.unchecked.size()):
             super().push(self.unchecked.pop())
-        self.cards.sort(key = lambda card: card.val)
+        self.ids = array('B', sorted(self.ids, key = VALS.__getitem__))
+        self.accepted = self.accepts()
+
+    def accepts(self) -> tuple[int, ...]:
+        '''Returns the ids of the deck's cards that would each make is_phase() True if pushed alone,
+        worked out from the validation state rather than by trying them
+
+        >>> p1 = Phase("run3")
+        >>> for face in [Faces.THREE, Faces.FOUR, Faces.WILD]:
+        ...     p1.push(Card(face, Colors.RED if face != Faces.WILD else Colors.ANY))
+        >>> sorted({POOL[num].val for num in p1.accepts()}) # 1 2 [3 4 w] 5 6, with the wild moved to an end
+        [1, 2, 5, 6, 25]
+        >>> p1 = Phase("set3c")
+        >>> for face in [Faces.ONE, Faces.SEVEN, Faces.NINE]:
+        ...     p1.push(Card(face, Colors.GREEN))
+        >>> {POOL[num].color for num in p1.accepts()} == {Colors.GREEN, Colors.ANY}
+        True
+        '''
+        kind = self.spec.kind
+        if self.num_skips or self.size() + self.unchecked.size() + 1 < self.spec.size:
+            return ()
+        if kind != "run":
+            if kind == "set":
+                held, keys = self.face_mask.bit_count(), FACE_IDS
+                key = self.face_mask.bit_length() - 1
+            else:
+                held, keys = self.num_colors, COLOR_IDS
+                key = next((color for color, count in enumerate(self.color_counts) if count), 0)
+            if held == 0: # only wilds, any number card decides it
+                return NUMBER_IDS
+            return keys[key] + WILD_IDS if held == 1 else ()
+        if self.num_dups:
+            return ()
+        wilds, mask = self.num_wilds, self.face_mask
+        gaps = lambda mask: mask.bit_length() - (mask & -mask).bit_length() + 1 - mask.bit_count()
+        accepted = WILD_IDS if mask == 0 or gaps(mask) <= wilds + 1 else ()
+        for face in FACE_IDS:
+            if not mask >> face & 1 and gaps(mask | 1 << face) <= wilds:
+                accepted += FACE_IDS[face]
+        return accepted
 
     def is_set(self, size: int, set_type: str):
         '''Returns true if cards creates a set of specified size and set_type (ie. "face" or "color") otherwise returns False
@@ -186,14 +401,12 @@ class Phase(Stack):
         >>> p1.is_set(3, "color")
         False
         '''
-        if self.size() + self.unchecked.size()  < size:
+        if self.size() + self.unchecked.size() < size:
             return False
         if set_type == "face":
-            return len({card.val for card in self.cards + self.unchecked.cards if card.val != 25}) == 1\
-            and self.num_skips == 0
+            return self.face_mask.bit_count() == 1 and self.num_skips == 0
         else:
-            return len({card.color_val for card in self.cards + self.unchecked.cards if card.val != 25}) == 1\
-            and self.num_skips == 0
+            return self.num_colors == 1 and self.num_skips == 0
     
     def is_run(self, size: int):
         '''Returns true if cards creates a run of specified size otherwise returns False
@@ -212,18 +425,13 @@ class Phase(Stack):
         '''
         if self.size() + self.unchecked.size() < size:
             return False
-        card_vals = [card.val for card in self.cards + self.unchecked.cards]
-        card_vals.sort()
-        num_wilds = card_vals.count(25)
-        expected_val = card_vals[0] + 1
-        for val_index in range(1, len(card_vals) - num_wilds): # looping over only the cards between the first value and the wilds
-            curr_val = card_vals[val_index]
-            if curr_val == card_vals[val_index - 1]: # cannot have duplicates
-                return False
-            else:
-                num_wilds -= curr_val - expected_val # difference of exp and curr is the required num of wilds
-                expected_val = curr_val + 1
-        return num_wilds >= 0 and self.num_skips == 0
+        if self.num_skips or self.num_dups:
+            return False
+        if self.face_mask == 0: # only wilds
+            return True
+        low = (self.face_mask & -self.face_mask).bit_length()
+        span = self.face_mask.bit_length() - low + 1
+        return span - self.face_mask.bit_count() <= self.num_wilds # gaps are filled by wilds
 
     def return_cards(self, stack: Stack):
         for _ in range(self.unchecked.size()):
@@ -237,7 +445,7 @@ class Phase(Stack):
         >>> Phase.descript("set3c")
         'A Set of 3 Colors'
         '''
-        return f"A {phase_str[:3].title()} of {phase_str[3]} {'Colors' if len(phase_str) == 5 else ''}".rstrip()
+        return phase_spec(phase_str).desc
 
     def desc(self):
         '''Returns a human readable description of the Phase contraints
@@ -248,21 +456,51 @@ class Phase(Stack):
         >>> p1.desc()
         'A Set of 3 Colors'
         '''
-        return Phase.descript(self.phase_str)
+        return self.spec.desc
 
     @staticmethod
     def str_phases(phases: list["Phase"]): # assumes at least one card in each phase
-        if len(phases) == 0:
-            return ""
-        phases_lines = [str(phase).split('\n') for phase in phases]
-        num_phases = len(phases_lines)
-        num_lines = len(phases_lines[0])
-        return '\n'.join(["    ".join([phases_lines[phase][line_num] 
-                                       for phase in range(num_phases)]) 
-                                       for line_num in range(num_lines)])
+        return Phase._str_phases(tuple([tuple(phase.ids + phase.unchecked.ids) for phase in phases]))
+
+    @staticmethod
+    @lru_cache(maxsize = 1024)
+    def _str_phases(phases_ids: tuple[tuple[int, ...], ...]) -> str:
+        return '\n'.join(["    ".join(phase_lines)
+                          for phase_lines in zip(*[Card.lines_ids(ids) for ids in phases_ids])])
 
     def __str__(self) -> str:
-        return Card.str_cards(self.cards + self.unchecked.cards)
+        return Card.str_ids(tuple(self.ids + self.unchecked.ids))
+
+class PhasePool:
+    '''Phases kept for reuse: release() takes a phase back, acquire() hands out a reset one,
+    building a new Phase only when none is free. created and reused count both
+
+    >>> pool = PhasePool()
+    >>> phase = pool.acquire("set3")
+    >>> phase.push(Card(Faces.ONE, Colors.RED))
+    >>> pool.release(phase)
+    >>> again = pool.acquire("run4")
+    >>> again is phase, again.size() + again.unchecked.size(), again.phase_str, pool.created, pool.reused
+    (True, 0, 'run4', 1, 1)
+    '''
+
+    def __init__(self):
+        self.free: list[Phase] = []
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, phase_str: str) -> Phase:
+        if not self.free:
+            self.created += 1
+            return Phase(phase_str)
+        self.reused += 1
+        phase = self.free.pop()
+        phase.reset(phase_str)
+        return phase
+
+    def release(self, phase: Phase):
+        '''Takes phase back, it must not be used again until acquired'''
+        self.free.append(phase)
 
 if __name__ == "__main__":
     from doctest import testmod
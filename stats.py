@@ -0,0 +1,227 @@
+'''Game statistics streamed to a compact columnar file: one row per player per round, and one per
+player per game. Rows are buffered into blocks, each stored column by column, so memory stays
+bounded while recording and a query only reads the columns it needs, a block at a time.
+Recording needs nothing beyond the standard library, the queries need NumPy
+
+    python stats.py record games.p10s --games 1000
+    python stats.py query games.p10s'''
+import os
+import sys
+from array import array
+from struct import Struct
+from engine import Engine
+
+try:
+    import numpy as np
+except ImportError: # recording still works
+    np = None
+
+MAGIC = b"P10S"
+BLOCK = Struct("<4sI") # magic, number of rows
+BLOCK_ROWS = 65536
+ROUND, GAME = 0, 1 # row kinds
+COLUMNS = (("game", "I"), # game number, counting on from the games already in the file
+           ("round", "H"), # round number in the game (for game rows, rounds played)
+           ("kind", "B"),
+           ("players", "B"),
+           ("seat", "B"),
+           ("phase", "B"), # phase played in the round (0-9), for game rows phases completed
+           ("completed", "B"), # phase completed this round, for game rows won the game
+           ("points", "I"), # total so far
+           ("scored", "H"), # points scored this round (for game rows, rounds played out)
+           ("left", "B"), # cards left in hand at the end of the round
+           ("turns", "H"),
+           ("skipped", "H"),
+           ("discard_draws", "H"),
+           ("deck_draws", "H"))
+
+class Recorder:
+    '''Appends rows to a stats file (a path or a binary file) a block at a time
+
+    >>> from io import BytesIO
+    >>> from bots import GreedyController
+    >>> sink = BytesIO()
+    >>> recorder = Recorder(sink)
+    >>> engine = Engine([GreedyController(), GreedyController()], [["set3"], ["run4"]], seed = 2)
+    >>> rounds = 0
+    >>> while engine.play_round():
+    ...     recorder.round(engine)
+    ...     rounds += 1
+    ...     if engine.game_over():
+    ...         break
+    >>> recorder.game(engine)
+    >>> recorder.close()
+    >>> _ = sink.seek(0)
+    >>> rows = [row for block in blocks(sink, ["kind", "seat", "completed"]) for row in zip(*block.values())]
+    >>> len(rows) == 2 * rounds + 2, [completed for kind, seat, completed in rows if kind == GAME].count(1)
+    (True, 1)
+    '''
+
+    def __init__(self, sink, block_rows: int = BLOCK_ROWS):
+        if isinstance(sink, str):
+            self.games = next_game(sink) if os.path.exists(sink) else 0
+            self.file = open(sink, "ab")
+        else:
+            self.games, self.file = 0, sink
+        self.block_rows = block_rows
+        self.columns = {name: array(code) for name, code in COLUMNS}
+        self.rounds = 0
+        self.totals: list[list[int]] = [] # turns, skipped, discard draws, deck draws per seat this game
+
+    def add(self, **row):
+        for name, column in self.columns.items():
+            column.append(row.get(name, 0))
+        if len(self.columns["game"]) >= self.block_rows:
+            self.flush()
+
+    def round(self, engine: Engine):
+        '''Records the round that was just scored'''
+        if not self.totals:
+            self.totals = [[0, 0, 0, 0] for _ in engine.players]
+        for seat, player in enumerate(engine.players):
+            self.add(game = self.games, round = self.rounds, kind = ROUND, players = len(engine.players), seat = seat,
+                     phase = player.phase - player.completed, completed = player.completed, points = player.points,
+                     scored = player.scored, left = player.left, turns = player.turns, skipped = player.skipped,
+                     discard_draws = player.discard_draws, deck_draws = player.deck_draws)
+            for index, amount in enumerate((player.turns, player.skipped, player.discard_draws, player.deck_draws)):
+                self.totals[seat][index] += amount
+        self.rounds += 1
+
+    def game(self, engine: Engine):
+        '''Records the game's totals, the winner (fewest points) as completed'''
+        best = min([player.points for player in engine.players])
+        for seat, player in enumerate(engine.players):
+            turns, skipped, discard_draws, deck_draws = self.totals[seat] if self.totals else (0, 0, 0, 0)
+            self.add(game = self.games, round = self.rounds, kind = GAME, players = len(engine.players), seat = seat,
+                     phase = player.phase, completed = player.points == best, points = player.points,
+                     scored = self.rounds, turns = turns, skipped = skipped,
+                     discard_draws = discard_draws, deck_draws = deck_draws)
+        self.games += 1
+        self.rounds = 0
+        self.totals = []
+
+    def flush(self):
+        '''Writes the buffered rows as a block'''
+        rows = len(self.columns["game"])
+        if rows == 0:
+            return
+        self.file.write(BLOCK.pack(MAGIC, rows))
+        for column in self.columns.values():
+            if sys.byteorder == "big":
+                column.byteswap()
+            self.file.write(column.tobytes())
+            del column[:]
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        if hasattr(self.file, "name"):
+            self.file.close()
+
+def blocks(source, names: list[str]):
+    '''Yields a block at a time as {name: array} holding only the named columns, skipping over the rest.
+    source is a path or a binary file'''
+    file = open(source, "rb") if isinstance(source, str) else source
+    try:
+        while header := file.read(BLOCK.size):
+            magic, rows = BLOCK.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("Not a Phase Ten stats file")
+            block = {}
+            for name, code in COLUMNS:
+                size = rows * array(code).itemsize
+                if name in names:
+                    block[name] = array(code, file.read(size))
+                    if sys.byteorder == "big":
+                        block[name].byteswap()
+                else:
+                    file.seek(size, 1)
+            yield {name: block[name] for name in names}
+    finally:
+        if isinstance(source, str):
+            file.close()
+
+def next_game(source) -> int:
+    '''Returns the number after the last game recorded'''
+    return max([max(block["game"], default = -1) for block in blocks(source, ["game"])], default = -1) + 1
+
+def _arrays(source, names: list[str]):
+    '''blocks() as NumPy arrays'''
+    if np is None:
+        raise ImportError("stats queries need NumPy")
+    for block in blocks(source, names):
+        yield [np.frombuffer(block[name], dtype = block[name].typecode) for name in names]
+
+def rounds_to_finish(source) -> dict[int, float]:
+    '''Returns, per phase (1-10), the average round of the game it was completed in'''
+    sums, counts = np.zeros(256), np.zeros(256)
+    for kind, rounds, phase, completed in _arrays(source, ["kind", "round", "phase", "completed"]):
+        done = (kind == ROUND) & (completed == 1)
+        sums += np.bincount(phase[done], weights = rounds[done] + 1.0, minlength = 256)
+        counts += np.bincount(phase[done], minlength = 256)
+    return {int(phase) + 1: sums[phase] / counts[phase] for phase in np.nonzero(counts)[0]}
+
+def _split_wins(wins, games, game, players, seat, won):
+    '''Adds game rows (every seat of each game) to the wins and games tallies, a win tied between seats split'''
+    _, index = np.unique(game, return_inverse = True)
+    winners = np.bincount(index, weights = won)
+    np.add.at(games, (players, seat), 1)
+    np.add.at(wins, (players, seat), won / np.maximum(winners[index], 1))
+
+def win_rate_by_seat(source) -> dict[tuple[int, int], float]:
+    '''Returns the share of games won (ties split) for every (number of players, seat). A game's rows are
+    written together, so only the last game of a block may go on in the next one and is carried over'''
+    wins, games = np.zeros((256, 256)), np.zeros((256, 256))
+    carried = [np.zeros(0, np.int64)] * 4
+    for kind, game, players, seat, completed in _arrays(source, ["kind", "game", "players", "seat", "completed"]):
+        rows = kind == GAME
+        columns = [np.concatenate((kept, column[rows].astype(np.int64)))
+                   for kept, column in zip(carried, (game, players, seat, completed))]
+        ended = columns[0] != columns[0][-1] if len(columns[0]) else np.zeros(0, bool)
+        _split_wins(wins, games, *[column[ended] for column in columns])
+        carried = [column[~ended] for column in columns]
+    _split_wins(wins, games, *carried)
+    return {(int(players), int(seat)): wins[players, seat] / games[players, seat] for players, seat in zip(*np.nonzero(games))}
+
+def draw_sources(source) -> dict[int, float]:
+    '''Returns, per phase being played (1-10), the share of draws taken from the discard'''
+    discard, total = np.zeros(256), np.zeros(256)
+    for kind, phase, discard_draws, deck_draws in _arrays(source, ["kind", "phase", "discard_draws", "deck_draws"]):
+        rows = kind == ROUND
+        discard += np.bincount(phase[rows], weights = discard_draws[rows], minlength = 256)
+        total += np.bincount(phase[rows], weights = discard_draws[rows] + deck_draws[rows].astype(float), minlength = 256)
+    return {int(phase) + 1: discard[phase] / total[phase] for phase in np.nonzero(total)[0]}
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description = "Phase Ten statistics")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    record = commands.add_parser("record", help = "record games between greedy players")
+    record.add_argument("path")
+    record.add_argument("--games", type = int, default = 1000)
+    record.add_argument("--players", type = int, default = 2)
+    record.add_argument("--seed", type = int, default = 0)
+    query = commands.add_parser("query", help = "summarize a stats file")
+    query.add_argument("path")
+    args = parser.parse_args()
+    if args.command == "record":
+        from bots import GreedyController
+        recorder = Recorder(args.path)
+        for number in range(args.games):
+            engine = Engine([GreedyController() for _ in range(args.players)], seed = args.seed + number)
+            while engine.play_round(500):
+                recorder.round(engine)
+                if engine.game_over():
+                    break
+            if engine.game_over():
+                recorder.game(engine)
+            else: # stuck, its rounds stay recorded without a game row
+                recorder.games, recorder.rounds, recorder.totals = recorder.games + 1, 0, []
+        recorder.close()
+    else:
+        for phase, rounds in rounds_to_finish(args.path).items():
+            print(f"phase {phase:2}: completed in round {rounds:5.2f} on average")
+        for (players, seat), rate in win_rate_by_seat(args.path).items():
+            print(f"{players} players, seat {seat + 1}: wins {rate:.1%}")
+        for phase, share in draw_sources(args.path).items():
+            print(f"phase {phase:2}: {share:.1%} of draws from the discard")
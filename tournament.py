@@ -0,0 +1,175 @@
+'''Headless tournaments between computer strategies, sharded over a process pool.
+Every shard plays its games from seeds derived from (seed, shard), so any shard can be replayed
+on its own. Results are appended to a JSON Lines file a shard at a time, and a rerun with the same
+file skips the shards already in it. Strategies are rated with multiplayer Elo (every pair of
+seats in a game is a match, fewer points wins, as Game.game_results declares the winner)
+
+    python tournament.py greedy random --games 100000 --players 2 --out results.jsonl'''
+import json
+import os
+from itertools import permutations
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter, process_time
+from engine import Engine, RandomController
+from bots import GreedyController, MCTSController
+
+STRATEGIES = {"random": lambda seed: RandomController(Random(seed)),
+              "greedy": lambda seed: GreedyController(),
+              "mcts": lambda seed: MCTSController(budget = 0.01, seed = seed)}
+ELO_START = 1500.0
+ELO_K = 16.0
+MAX_TURNS = 500 # per round, a game stuck longer is recorded unfinished and left out of the ratings
+
+def lineups(names: list[str], num_players: int) -> list[tuple[str, ...]]:
+    '''Every seating of num_players strategies, each strategy in each seat as often as the others
+    >>> lineups(["a", "b"], 2)
+    [('a', 'b'), ('b', 'a')]
+    >>> len(lineups(["a", "b", "c"], 2)), lineups(["a"], 2)
+    (6, [('a', 'a')])
+    '''
+    if len(names) >= num_players:
+        return list(permutations(names, num_players))
+    return [tuple([names[(start + seat) % len(names)] for seat in range(num_players)]) for start in range(len(names))]
+
+def game_seeds(seed: int, shard: int, count: int) -> list[int]:
+    rng = Random(f"{seed}:{shard}")
+    return [rng.getrandbits(63) for _ in range(count)]
+
+def play_shard(job: tuple) -> tuple[int, list[dict], float]:
+    '''Worker: plays a shard's games. Returns the shard, a result per game and the CPU seconds used'''
+    shard, first, count, seed, seatings = job
+    start = process_time()
+    results = []
+    engine = None # one engine per shard, reset for every game
+    for number, game_seed in enumerate(game_seeds(seed, shard, count), first):
+        seats = seatings[number % len(seatings)]
+        controllers = [STRATEGIES[name](game_seed + seat) for seat, name in enumerate(seats)]
+        if engine is None:
+            engine = Engine(controllers, seed = game_seed)
+        else:
+            engine.reset(seed = game_seed, controllers = controllers)
+        finished = engine.play_game(MAX_TURNS)
+        for controller in engine.controllers:
+            if hasattr(controller, "close"):
+                controller.close()
+        results.append({"shard": shard, "game": number, "seed": game_seed, "seats": seats, "finished": finished,
+                        "points": [player.points for player in engine.players],
+                        "phases": [player.phase for player in engine.players]})
+    return shard, results, process_time() - start
+
+def expected(rating: float, opponent: float) -> float:
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+def rate(ratings: dict[str, float], seats: list[str], points: list[int], k: float = ELO_K):
+    '''Updates ratings with a game: every pair of seats is a match won by the fewer points.
+    A strategy playing itself is left alone
+    >>> ratings = {"a": 1500.0, "b": 1500.0}
+    >>> rate(ratings, ["a", "b"], [50, 120])
+    >>> ratings
+    {'a': 1508.0, 'b': 1492.0}
+    '''
+    changes = dict.fromkeys(seats, 0.0)
+    for one in range(len(seats)):
+        for other in range(one + 1, len(seats)):
+            if seats[one] == seats[other]:
+                continue
+            score = 1.0 if points[one] < points[other] else 0.5 if points[one] == points[other] else 0.0
+            change = k * (score - expected(ratings[seats[one]], ratings[seats[other]]))
+            changes[seats[one]] += change
+            changes[seats[other]] -= change
+    for name, change in changes.items():
+        ratings[name] += change
+
+def completed_shards(path: str) -> dict[int, list[dict]]:
+    '''Reads the whole shards already in a results file (a shard cut short by a crash is dropped)'''
+    shards: dict[int, dict[int, dict]] = {} # by shard then game, a replayed shard overwrites its partial copy
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError: # half written by a crash
+                continue
+            shards.setdefault(result["shard"], {})[result["game"]] = result
+    return {shard: [results[game] for game in sorted(results)] for shard, results in shards.items()
+            if any([result.get("last") for result in results.values()])}
+
+def rate_shard(results: list[dict], ratings: dict[str, float], wins: dict[str, float]) -> int:
+    '''Rates a shard's finished games and adds up their wins (ties split). Returns the number unfinished'''
+    unfinished = 0
+    for result in results:
+        if not result["finished"]:
+            unfinished += 1
+            continue
+        rate(ratings, result["seats"], result["points"])
+        best = min(result["points"])
+        winners = [name for name, points in zip(result["seats"], result["points"]) if points == best]
+        for name in winners:
+            wins[name] += 1 / len(winners)
+    return unfinished
+
+def tournament(names: list[str], games: int, num_players: int = 2, shard_size: int = 200, workers: int = None,
+               seed: int = 0, out: str = "results.jsonl") -> dict:
+    '''Plays games (resuming from out), returns ratings, wins and speed. Ratings, wins and played count
+    every game, resumed ones included; the speeds only the games played by this call
+
+    >>> import tempfile
+    >>> out = os.path.join(tempfile.mkdtemp(), "results.jsonl")
+    >>> first = tournament(["greedy", "random"], 4, shard_size = 2, workers = 1, out = out)
+    >>> again = tournament(["greedy", "random"], 4, shard_size = 2, workers = 1, out = out)
+    >>> again["ratings"] == first["ratings"], again["wins"] == first["wins"], again["played"], again["resumed"]
+    (True, True, 4, 4)
+    '''
+    seatings = lineups(names, num_players)
+    num_shards = -(-games // shard_size)
+    done = {shard: results for shard, results in completed_shards(out).items() if shard < num_shards}
+    jobs = [(shard, shard * shard_size, min(shard_size, games - shard * shard_size), seed, seatings)
+            for shard in range(num_shards) if shard not in done]
+    workers = workers or os.cpu_count()
+    ratings = dict.fromkeys(names, ELO_START)
+    wins = dict.fromkeys(names, 0.0)
+    unfinished = new = 0
+    cpu = 0.0
+    pending, next_shard = dict(done), 0 # shards are rated in order so ratings don't depend on scheduling
+    resumed = sum([len(results) for results in done.values()])
+    start = perf_counter()
+    with open(out, "a+") as file, Pool(workers) as pool:
+        if file.tell() and (file.seek(file.tell() - 1), file.read(1))[1] != "\n":
+            file.write("\n") # end a line cut short by a crash
+
+        for shard, results, seconds in pool.imap_unordered(play_shard, jobs):
+            results[-1]["last"] = True
+            file.write("".join([json.dumps(result) + "\n" for result in results]))
+            file.flush()
+            pending[shard] = results
+            new += len(results)
+            cpu += seconds
+            while next_shard in pending:
+                unfinished += rate_shard(pending.pop(next_shard), ratings, wins)
+                next_shard += 1
+    while next_shard in pending: # resumed shards after the last one played
+        unfinished += rate_shard(pending.pop(next_shard), ratings, wins)
+        next_shard += 1
+    elapsed = perf_counter() - start
+    return {"ratings": ratings, "wins": wins, "unfinished": unfinished, "played": resumed + new, "resumed": resumed,
+            "seconds": elapsed, "games_per_second": new / elapsed if elapsed else 0.0,
+            "games_per_core_second": new / cpu if cpu else 0.0}
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description = "Phase Ten tournament between computer strategies")
+    parser.add_argument("strategies", nargs = "+", choices = sorted(STRATEGIES))
+    parser.add_argument("--games", type = int, default = 10000)
+    parser.add_argument("--players", type = int, default = 2)
+    parser.add_argument("--shard", type = int, default = 200, help = "games per shard")
+    parser.add_argument("--workers", type = int, default = None, help = "processes (every core by default)")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--out", default = "results.jsonl")
+    args = parser.parse_args()
+    report = tournament(args.strategies, args.games, args.players, args.shard, args.workers, args.seed, args.out)
+    for name in sorted(report["ratings"], key = lambda name: -report["ratings"][name]):
+        print(f"{name:10} elo {report['ratings'][name]:7.1f}   wins {report['wins'][name]:9.1f}")
+    print(f"{report['played']} games ({report['resumed']} resumed) in {report['seconds']:.1f}s ({report['unfinished']} unfinished): "
+          f"{report['games_per_second']:.1f} games/s, {report['games_per_core_second']:.1f} games/s per core")
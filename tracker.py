@@ -0,0 +1,130 @@
+'''Keeps count of the cards one seat can't see, updated move by move as an Engine observer
+instead of being worked out again for every decision
+
+>>> from bots import GreedyController
+>>> engine = Engine([GreedyController() for _ in range(3)], [["set3", "run4"], ["run7"], ["set4", "set4"]], seed = 5)
+>>> trackers = [CardTracker(engine, seat) for seat in range(3)]
+>>> turns = checked = 0
+>>> while engine.step is not Step.GAME_OVER:
+...     if engine.step is Step.DEAL:
+...         engine.deal()
+...     engine.play_turn()
+...     if engine.step is Step.DRAW: # mid round (hands are scored and cleared at the end)
+...         turns += 1
+...         checked += all([tracker.hidden() == hidden_counts(engine, tracker.seat) for tracker in trackers])
+>>> checked == turns > 20
+True
+>>> tracker = trackers[0]
+>>> sum(tracker.unseen) == sum([tracker.face_left(face) for face in Faces]) == sum([tracker.color_left(color) for color in Colors])
+True
+'''
+from card import Faces, Colors, NUM_IDS, VALS, COLOR_VALS
+from stack import DECK_COUNTS
+from engine import Engine, Observer, Player, Step
+
+def hidden_counts(engine: Engine, seat: int) -> list[int]:
+    '''Returns, per card id, how many are in the deck or the other players' hands, counted from scratch'''
+    counts = list(DECK_COUNTS)
+    stacks = [engine.players[seat].cards, engine.pickup.discard] + [phase for phase in engine.tabled()]
+    for stack in stacks:
+        for num in stack.ids:
+            counts[num] -= 1
+    return counts
+
+class CardTracker(Observer):
+    '''Counts, per card id, the cards seat can't see: the deck less its own hand, the discard, the tabled
+    phases and the cards the other players are known to hold (taken from the discard and not played since).
+    Also keeps those counts per face and per color, and every card each player took from the discard this round'''
+
+    def __init__(self, engine: Engine, seat: int):
+        self.seat = seat
+        self.unseen = [0] * NUM_IDS
+        self.faces = [0] * (Faces.WILD.value + 1) # indexed by val
+        self.colors = [0] * len(Colors) # indexed by color val
+        self.discard = [0] * NUM_IDS
+        self.held = [[0] * NUM_IDS for _ in engine.players] # per seat, known to be in hand (own seat unused)
+        self.taken: list[list[int]] = [[] for _ in engine.players] # per seat, in order
+        engine.observers.append(self)
+        self.restored(engine)
+
+    def _count(self, num: int, step: int):
+        self.unseen[num] += step
+        self.faces[VALS[num]] += step
+        self.colors[COLOR_VALS[num]] += step
+
+    def _reveal(self, seat: int, num: int):
+        '''A card left seat's hand face up'''
+        if seat == self.seat:
+            return
+        if self.held[seat][num]:
+            self.held[seat][num] -= 1
+        else:
+            self._count(num, -1)
+
+    def dealt(self, engine: Engine):
+        self.taken = [[] for _ in engine.players]
+        self.restored(engine)
+
+    def drew(self, engine: Engine, player: Player, card_id: int, from_discard: bool):
+        seat = engine.players.index(player)
+        if from_discard:
+            self.discard[card_id] -= 1
+            if seat != self.seat:
+                self.held[seat][card_id] += 1
+                self.taken[seat].append(card_id)
+        elif seat == self.seat:
+            self._count(card_id, -1)
+
+    def tabled(self, engine: Engine, player: Player, card_ids: bytes):
+        seat = engine.players.index(player)
+        for num in card_ids:
+            self._reveal(seat, num)
+
+    def discarded(self, engine: Engine, player: Player, card_id: int):
+        self._reveal(engine.players.index(player), card_id)
+        self.discard[card_id] += 1
+
+    def recycled(self, engine: Engine):
+        top = engine.pickup.discard.ids[-1]
+        for num, count in enumerate(self.discard):
+            if count:
+                self._count(num, count - (num == top))
+                self.discard[num] = int(num == top)
+
+    def restored(self, engine: Engine):
+        '''Counts everything again from the engine. What the other players took from the discard
+        can't be told from a snapshot, so those cards count as unseen again'''
+        self.unseen, self.faces, self.colors = [0] * NUM_IDS, [0] * len(self.faces), [0] * len(self.colors)
+        for num, count in enumerate(hidden_counts(engine, self.seat)):
+            if count:
+                self._count(num, count)
+        self.discard = [0] * NUM_IDS
+        for num in engine.pickup.discard.ids:
+            self.discard[num] += 1
+        self.held = [[0] * NUM_IDS for _ in engine.players]
+
+    def face_left(self, face: Faces) -> int:
+        '''Unseen cards of a face'''
+        return self.faces[face.value] if face.value >= 0 else 0
+
+    def color_left(self, color: Colors) -> int:
+        '''Unseen cards of a color (wilds are Colors.ANY, skips Colors.NONE)'''
+        return self.colors[color.value]
+
+    def holding(self, seat: int) -> list[int]:
+        '''Ids of the cards seat is known to hold'''
+        return [num for num, count in enumerate(self.held[seat]) for _ in range(count)]
+
+    def hidden(self) -> list[int]:
+        '''Per card id, the unseen cards and the ones the other players are known to hold,
+        in other words every card not in view of seat'''
+        counts = list(self.unseen)
+        for seat, held in enumerate(self.held):
+            if seat != self.seat:
+                for num, count in enumerate(held):
+                    counts[num] += count
+        return counts
+
+    def unseen_ids(self) -> list[int]:
+        '''The unseen cards as a list of ids (one per card), ex. for odds.phase_odds'''
+        return [num for num, count in enumerate(self.unseen) for _ in range(count)]